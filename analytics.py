@@ -0,0 +1,227 @@
+from collections import Counter
+from datetime import date
+from sqlalchemy import event, inspect, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, object_session
+from models import db, Venue, Artist, Show, VenueMonthlyShows, CityGenreShows, ArtistMonthlyBookings
+
+# Rollups are updated in the same transaction as the show insert/delete, so
+# every chart is a primary-key range read instead of a scan over shows. The
+# changes of one flush are summed and written together.
+
+
+def month_of(value):
+    return date(value.year, value.month, 1)
+
+
+def split_genres(genres):
+    return [genre.strip() for genre in (genres or '').split(',') if genre.strip()]
+
+
+ROLLUP_KEYS = {
+    VenueMonthlyShows: ('venue_id', 'month'),
+    ArtistMonthlyBookings: ('artist_id', 'month'),
+    CityGenreShows: ('city', 'state', 'genre'),
+}
+
+
+def show_row(show):
+    # the create form hands the ids over as strings
+    return {'venue_id': int(show.venue_id), 'artist_id': int(show.artist_id), 'start_time': show.start_time}
+
+
+def add_shows(connection, deltas, shows, delta):
+    # venue cities and artist genres for all the shows in two queries
+    venues = {row.id: row for row in connection.execute(
+        select(Venue.id, Venue.city, Venue.state).where(Venue.id.in_({show['venue_id'] for show in shows}))
+    )}
+    genres = dict(connection.execute(
+        select(Artist.id, Artist.genres).where(Artist.id.in_({show['artist_id'] for show in shows}))
+    ).all())
+    for show in shows:
+        month = month_of(show['start_time'])
+        deltas[VenueMonthlyShows][(show['venue_id'], month)] += delta
+        deltas[ArtistMonthlyBookings][(show['artist_id'], month)] += delta
+        venue = venues.get(show['venue_id'])
+        if venue is not None:
+            for genre in split_genres(genres.get(show['artist_id'])):
+                deltas[CityGenreShows][(venue.city, venue.state, genre)] += delta
+
+
+def bump(connection, deltas):
+    # one multi-row upsert per rollup, however many shows the flush touched
+    for model, counts in deltas.items():
+        keys = ROLLUP_KEYS[model]
+        rows = [dict(zip(keys, key), show_count=count) for key, count in counts.items() if count]
+        if not rows:
+            continue
+        statement = insert(model.__table__).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={'show_count': model.__table__.c.show_count + statement.excluded.show_count}
+        )
+        connection.execute(statement)
+
+
+def pending_deltas(session):
+    return session.info.setdefault('rollup_deltas', {model: Counter() for model in ROLLUP_KEYS})
+
+
+@event.listens_for(Session, 'before_flush')
+def shows_deleting(session, flush_context, instances):
+    # looked up before the flush: deleting a venue deletes it in the same
+    # flush as its shows.
+    deleted = [show_row(obj) for obj in session.deleted if isinstance(obj, Show)]
+    if deleted:
+        add_shows(session.connection(), pending_deltas(session), deleted, -1)
+
+
+@event.listens_for(Show, 'after_insert')
+def show_created(mapper, connection, target):
+    object_session(target).info.setdefault('rollup_created', []).append(show_row(target))
+
+
+@event.listens_for(Session, 'after_flush')
+def apply_rollups(session, flush_context):
+    created = session.info.pop('rollup_created', None)
+    if created:
+        add_shows(session.connection(), pending_deltas(session), created, 1)
+    deltas = session.info.pop('rollup_deltas', None)
+    if deltas:
+        bump(session.connection(), deltas)
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_rollups(session):
+    session.info.pop('rollup_created', None)
+    session.info.pop('rollup_deltas', None)
+
+
+# city_genre_shows counts a show under its venue's city and its artist's
+# genres, so editing either moves the counts of all their shows; otherwise a
+# later delete would subtract from a key the show was never counted under.
+
+
+def old_value(target, column):
+    history = inspect(target).attrs[column].history
+    return history.deleted[0] if history.deleted else getattr(target, column)
+
+
+@event.listens_for(Artist, 'after_update')
+def artist_updated(mapper, connection, target):
+    old, new = set(split_genres(old_value(target, 'genres'))), set(split_genres(target.genres))
+    if old == new:
+        return
+    moved = sorted(old - new) + sorted(new - old)
+    deltas = [-1] * len(old - new) + [1] * len(new - old)
+    connection.execute(text(
+        "INSERT INTO city_genre_shows (city, state, genre, show_count) "
+        "SELECT venues.city, venues.state, moved.genre, count(*) * moved.delta "
+        "FROM shows "
+        "JOIN venues ON venues.id = shows.venue_id "
+        "CROSS JOIN unnest(CAST(:genres AS text[]), CAST(:deltas AS integer[])) AS moved(genre, delta) "
+        "WHERE shows.artist_id = :artist_id "
+        "GROUP BY venues.city, venues.state, moved.genre, moved.delta "
+        "ON CONFLICT (city, state, genre) DO UPDATE "
+        "SET show_count = city_genre_shows.show_count + excluded.show_count"
+    ), {'genres': moved, 'deltas': deltas, 'artist_id': target.id})
+
+
+@event.listens_for(Venue, 'after_update')
+def venue_updated(mapper, connection, target):
+    old = (old_value(target, 'city'), old_value(target, 'state'))
+    if old == (target.city, target.state):
+        return
+    connection.execute(text(
+        "INSERT INTO city_genre_shows (city, state, genre, show_count) "
+        "SELECT moved.city, moved.state, trim(genre), count(*) * moved.delta "
+        "FROM shows "
+        "JOIN artists ON artists.id = shows.artist_id "
+        "CROSS JOIN LATERAL unnest(string_to_array(artists.genres, ',')) AS genre "
+        "CROSS JOIN (VALUES (CAST(:old_city AS varchar), CAST(:old_state AS varchar), -1), "
+        "(CAST(:city AS varchar), CAST(:state AS varchar), 1)) AS moved(city, state, delta) "
+        "WHERE shows.venue_id = :venue_id AND trim(genre) <> '' "
+        "GROUP BY moved.city, moved.state, trim(genre), moved.delta "
+        "ON CONFLICT (city, state, genre) DO UPDATE "
+        "SET show_count = city_genre_shows.show_count + excluded.show_count"
+    ), {'old_city': old[0], 'old_state': old[1], 'city': target.city, 'state': target.state,
+        'venue_id': target.id})
+
+
+def rebuild():
+    # full backfill from shows, e.g. after a bulk import or genre edits
+    for model in (VenueMonthlyShows, CityGenreShows, ArtistMonthlyBookings):
+        db.session.execute(model.__table__.delete())
+    db.session.execute(text(
+        "INSERT INTO venue_monthly_shows (venue_id, month, show_count) "
+        "SELECT venue_id, date_trunc('month', start_time)::date, count(*) "
+        "FROM shows GROUP BY 1, 2"
+    ))
+    db.session.execute(text(
+        "INSERT INTO artist_monthly_bookings (artist_id, month, show_count) "
+        "SELECT artist_id, date_trunc('month', start_time)::date, count(*) "
+        "FROM shows GROUP BY 1, 2"
+    ))
+    db.session.execute(text(
+        "INSERT INTO city_genre_shows (city, state, genre, show_count) "
+        "SELECT venues.city, venues.state, trim(genre), count(*) "
+        "FROM shows "
+        "JOIN venues ON venues.id = shows.venue_id "
+        "JOIN artists ON artists.id = shows.artist_id "
+        "CROSS JOIN LATERAL unnest(string_to_array(artists.genres, ',')) AS genre "
+        "WHERE trim(genre) <> '' "
+        "GROUP BY 1, 2, 3"
+    ))
+    db.session.commit()
+
+
+def busiest_venues(month, limit=10):
+    rows = (
+        db.session.query(Venue.id, Venue.name, Venue.city, Venue.state, VenueMonthlyShows.show_count)
+        .join(VenueMonthlyShows, VenueMonthlyShows.venue_id == Venue.id)
+        .filter(VenueMonthlyShows.month == month_of(month))
+        .filter(VenueMonthlyShows.show_count > 0)
+        .order_by(VenueMonthlyShows.show_count.desc(), Venue.id)
+        .limit(limit)
+        .all()
+    )
+    return [
+        {'id': row.id, 'name': row.name, 'city': row.city, 'state': row.state, 'num_shows': row.show_count}
+        for row in rows
+    ]
+
+
+def top_genres_by_city(limit=5):
+    rows = (
+        CityGenreShows.query
+        .filter(CityGenreShows.show_count > 0)
+        .order_by(CityGenreShows.state, CityGenreShows.city, CityGenreShows.show_count.desc(), CityGenreShows.genre)
+        .all()
+    )
+    data = []
+    for row in rows:
+        if not data or (data[-1]['city'], data[-1]['state']) != (row.city, row.state):
+            data.append({'city': row.city, 'state': row.state, 'genres': []})
+        if len(data[-1]['genres']) < limit:
+            data[-1]['genres'].append({'genre': row.genre, 'num_shows': row.show_count})
+    return data
+
+
+def artist_booking_frequency(since, until, limit=20):
+    total = db.func.sum(ArtistMonthlyBookings.show_count)
+    rows = (
+        db.session.query(Artist.id, Artist.name, total.label('num_shows'),
+                         db.func.count(ArtistMonthlyBookings.month).label('active_months'))
+        .join(ArtistMonthlyBookings, ArtistMonthlyBookings.artist_id == Artist.id)
+        .filter(ArtistMonthlyBookings.month >= month_of(since))
+        .filter(ArtistMonthlyBookings.month <= month_of(until))
+        .filter(ArtistMonthlyBookings.show_count > 0)
+        .group_by(Artist.id, Artist.name)
+        .order_by(total.desc(), Artist.id)
+        .limit(limit)
+        .all()
+    )
+    return [
+        {'id': row.id, 'name': row.name, 'num_shows': row.num_shows, 'active_months': row.active_months}
+        for row in rows
+    ]
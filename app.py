@@ -3,20 +3,38 @@
 #----------------------------------------------------------------------------#
 
 import json
+from datetime import datetime, timedelta
+import os
+import queue
 from traceback import format_list
 import dateutil.parser
 import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for, jsonify, abort
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, jsonify, abort, send_from_directory, stream_with_context
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
-import logging
-from logging import Formatter, FileHandler
 from flask_wtf import Form
 from forms import *
 from flask_migrate import Migrate
-from models import db, Artist, Venue, Show
+from jinja2 import FileSystemBytecodeCache
+from flask.cli import AppGroup
+from werkzeug.exceptions import TooManyRequests
+from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.utils import safe_join
+import click
+from models import db, Artist, Venue, Show, apply_changes
+from sqlalchemy.orm import contains_eager
+from sqlalchemy.orm.exc import StaleDataError
+import partitions
+import changes
+from search_cache import SearchCache
+from request_logging import init_logging
+import profiling
+import analytics
+from matchmaking import Matchmaker
+import assets
+import show_events
+import snapshot
 from sqlalchemy import func
-import sys
 import collections
 collections.Callable = collections.abc.Callable
 #----------------------------------------------------------------------------#
@@ -26,8 +44,23 @@ collections.Callable = collections.abc.Callable
 app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['TEMPLATE_CACHE_DIR'])
+if app.config['TRUSTED_PROXIES']:
+    # behind a router remote_addr is the router; rate limits and the access
+    # log need the client address it forwards.
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXIES'], x_proto=app.config['TRUSTED_PROXIES'])
 db.init_app(app)
 migrate = Migrate(app, db)
+init_logging(app)
+assets.init_assets(app)
+show_events.init_show_events(app)
+matchmaker = Matchmaker(refresh_interval=app.config['MATCH_REFRESH_SECONDS'], lag=app.config['CHANGES_LAG_SECONDS'])
+profiling.init_profiling(app)
+search_cache = SearchCache(
+    ttl=app.config['SEARCH_CACHE_TTL'],
+    rate=app.config['SEARCH_RATE_LIMIT'],
+    burst=app.config['SEARCH_RATE_BURST']
+)
 
 # connect to a local postgresql database
 #----------------------------------------------------------------------------#
@@ -46,6 +79,15 @@ def format_datetime(value, format='medium'):
 
 app.jinja_env.filters['datetime'] = format_datetime
 
+
+def stream_template(template_name, **context):
+    # Flask 2.0 has no stream_template: the page goes out in chunks while the
+    # template iterates its rows, instead of being rendered into one string.
+    app.update_template_context(context)
+    stream = app.jinja_env.get_template(template_name).stream(context)
+    stream.enable_buffering(app.config['STREAM_BUFFER_SIZE'])
+    return Response(stream_with_context(stream))
+
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
@@ -60,55 +102,73 @@ def index():
 #  ----------------------------------------------------------------
 
 
+def upcoming_show_counts():
+    return (
+        db.session.query(Show.venue_id.label('venue_id'), Show.artist_id.label('artist_id'))
+        .filter(Show.start_time > datetime.now())
+        .subquery()
+    )
+
+
+def venue_areas():
+    upcoming = upcoming_show_counts()
+    rows = (
+        db.session.query(Venue.id, Venue.name, Venue.city, Venue.state, func.count(upcoming.c.venue_id))
+        .outerjoin(upcoming, upcoming.c.venue_id == Venue.id)
+        .group_by(Venue.id)
+        .order_by(Venue.state, Venue.city, Venue.id)
+        .all()
+    )
+    data = []
+    for venue_id, name, city, state, num_upcoming_shows in rows:
+        if not data or (data[-1]['city'], data[-1]['state']) != (city, state):
+            data.append({'city': city, 'state': state, 'venues': []})
+        data[-1]['venues'].append({'id': venue_id, 'name': name, 'num_upcoming_shows': num_upcoming_shows})
+    return data
+
+
 @app.route('/venues')
 def venues():
-    areas = (
-        db.session.query(func.count(Venue.id), Venue.city, Venue.state).group_by(Venue.city, Venue.state).all()
+    return render_template('pages/venues.html', areas=venue_areas())
+
+
+def throttle_search():
+    retry_after = search_cache.throttle(request.remote_addr)
+    if retry_after:
+        raise TooManyRequests(retry_after=int(retry_after) + 1)
+
+
+def find_venues(search_term):
+    upcoming = upcoming_show_counts()
+    rows = (
+        db.session.query(Venue.id, Venue.name, func.count(upcoming.c.venue_id))
+        .outerjoin(upcoming, upcoming.c.venue_id == Venue.id)
+        .filter(Venue.name.ilike(f"%{search_term}%"))
+        .group_by(Venue.id)
+        .order_by(Venue.id)
+        .all()
     )
-    data=[]
-    for loc in areas:
-        venues = (
-            Venue.query.filter_by(state=loc.state).filter_by(city=loc.city).all()
-        )
-        venue_data = []
-        for ven in venues:
-            venue_data.append(
-                {
-                    'id': ven.id,
-                    'name': ven.name,
-                    'num_upcoming_shows': len(db.session.query(Show).filter(Show.venue_id == 1).filter(Show.start_time > datetime.now()).all())
-                }
-            )
-        data.append(
-            {'city': loc.city, 'state': loc.state, 'venues': venue_data})
-    return render_template('pages/venues.html', areas=data)
+    items = [{'id': i, 'name': name, 'num_upcoming_shows': count} for i, name, count in rows]
+    return {'count': len(items), 'data': items}
 
 
 @app.route('/venues/search', methods=['POST'])
 def search_venues():
-    search_term = request.form.get('search_term', None)
-    data = Venue.query.filter(Venue.name.ilike(f"%{search_term}%")).all()
-    items = []
-    for i in data:
-        item = {
-            'id': i.id,
-            'name': i.name,
-            'num_upcoming_shows': len(db.session.query(Show).filter(Show.venue_id == i.id).filter(Show.start_time > datetime.now()).all())
-        }
-        items.append(item)
-    response = {'count': len(items), 'data': items}
+    throttle_search()
+    search_term = request.form.get('search_term', '')
+    response = search_cache.get_or_compute(
+        ('venues', search_term.lower()), lambda: find_venues(search_term))
     return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
 
 
-@app.route('/venues/<int:venue_id>')
-def show_venue(venue_id):
+def venue_detail(venue_id):
     venue = Venue.query.get(venue_id)
     upcoming_shows = []
     past_shows = []
     past_shows_count = set([])
     upcoming_shows_count = set([])
 
-    for i in (db.session.query(Show).join(Artist).filter(Show.venue_id == venue_id).filter(Show.start_time > datetime.now()).all()):
+    for i in (db.session.query(Show).join(Artist).options(contains_eager(Show.artist)).filter(Show.venue_id == venue_id).filter(Show.start_time > datetime.now()).all()):
         upcomingShow = {
             'artist_id': i.artist_id,
             'artist_name': i.artist.name,
@@ -117,7 +177,7 @@ def show_venue(venue_id):
         }
         upcoming_shows.append(upcomingShow)
         upcoming_shows_count.add(i.artist_id)
-    for i in (db.session.query(Show).join(Artist).filter(Show.venue_id == venue_id).filter(Show.start_time < datetime.now()).all()):
+    for i in (db.session.query(Show).join(Artist).options(contains_eager(Show.artist)).filter(Show.venue_id == venue_id).filter(Show.start_time < datetime.now()).all()):
         pastShow = {
             'artist_id': i.artist_id,
             'artist_name': i.artist.name,
@@ -145,7 +205,12 @@ def show_venue(venue_id):
         'past_shows_count': len(past_shows_count),
         'past_shows': past_shows
     }
-    return render_template('pages/show_venue.html', venue=data)
+    return data
+
+
+@app.route('/venues/<int:venue_id>')
+def show_venue(venue_id):
+    return render_template('pages/show_venue.html', venue=venue_detail(venue_id))
 
 #  ----------------------------------------------------------------
 #  Create Venue
@@ -193,7 +258,7 @@ def create_venue_submission():
         flash('Venue ' + request.form['name'] + ' was successfully listed!')
     except:
         db.session.rollback()
-        print(sys.exc_info())
+        app.logger.exception('Venue could not be listed')
         # on unsuccessful db insert, flash an error instead.
         flash("An error occurred. Venue " + request.form['name'] + " could not be listed.")
     finally:
@@ -210,7 +275,7 @@ def delete_venue(venue_id):
         flash("Venue " + venue.name + " was deleted successfully!")
     except:
         db.session.rollback()
-        print(sys.exc_info())
+        app.logger.exception('Venue %s could not be deleted', venue_id)
         flash("Venue was not deleted successfully.")
     finally:
         db.session.close()
@@ -222,40 +287,51 @@ def delete_venue(venue_id):
 #  ----------------------------------------------------------------
 
 
+def listed_artists():
+    rows = (
+        db.session.query(Artist.id, Artist.name)
+        .order_by(Artist.id)
+        .yield_per(app.config['LISTING_BATCH_SIZE'])
+    )
+    return ({"id": row.id, "name": row.name} for row in rows)
+
+
 @app.route('/artists')
 def artists():
-    data = []
-    artists = Artist.query.order_by("id").all()
-    for artist in artists:
-        data.append({"id": artist.id, "name": artist.name})
-    return render_template('pages/artists.html', artists=data)
+    return stream_template('pages/artists.html', artists=listed_artists())
+
+
+def find_artists(search_term):
+    upcoming = upcoming_show_counts()
+    rows = (
+        db.session.query(Artist.id, Artist.name, func.count(upcoming.c.artist_id))
+        .outerjoin(upcoming, upcoming.c.artist_id == Artist.id)
+        .filter(Artist.name.ilike(f"%{search_term}%"))
+        .group_by(Artist.id)
+        .order_by(Artist.id)
+        .all()
+    )
+    items = [{'id': i, 'name': name, 'num_upcoming_shows': count} for i, name, count in rows]
+    return {'count': len(items), 'data': items}
 
 
 @app.route('/artists/search', methods=['POST'])
 def search_artists():
-    search_term = request.form.get('search_term', None)
-    data = Artist.query.filter(Artist.name.ilike(f"%{search_term}%")).all()
-    items = []
-    for i in data:
-        item = {
-            'id': i.id,
-            'name': i.name,
-            'num_upcoming_shows': len(db.session.query(Show).filter(Show.artist_id == i.id).filter(Show.start_time > datetime.now()).all())
-        }
-        items.append(item)
-    response = {'count': len(items), 'data': items}
+    throttle_search()
+    search_term = request.form.get('search_term', '')
+    response = search_cache.get_or_compute(
+        ('artists', search_term.lower()), lambda: find_artists(search_term))
     return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
 
 
-@app.route('/artists/<int:artist_id>')
-def show_artist(artist_id):
+def artist_detail(artist_id):
     artist = Artist.query.get(artist_id)
     upcoming_shows = []
     past_shows = []
     past_shows_count = set([])
     upcoming_shows_count = set([])
 
-    for i in (db.session.query(Show).join(Venue).filter(Show.artist_id == artist_id).filter(Show.start_time > datetime.now()).all()):
+    for i in (db.session.query(Show).join(Venue).options(contains_eager(Show.venue)).filter(Show.artist_id == artist_id).filter(Show.start_time > datetime.now()).all()):
         upcomingShow = {
             'venue_id': i.venue_id,
             'venue_name': i.venue.name,
@@ -264,7 +340,7 @@ def show_artist(artist_id):
         }
         upcoming_shows.append(upcomingShow)
         upcoming_shows_count.add(i.venue_id)
-    for i in (db.session.query(Show).join(Venue).filter(Show.artist_id == artist_id).filter(Show.start_time < datetime.now()).all()):
+    for i in (db.session.query(Show).join(Venue).options(contains_eager(Show.venue)).filter(Show.artist_id == artist_id).filter(Show.start_time < datetime.now()).all()):
         pastShow = {
             'venue_id': i.venue_id,
             'venue_name': i.venue.name,
@@ -291,13 +367,78 @@ def show_artist(artist_id):
         'past_shows_count': len(past_shows_count),
         'past_shows': past_shows
     }
-    return render_template('pages/show_artist.html', artist=data)
+    return data
+
+
+@app.route('/artists/<int:artist_id>')
+def show_artist(artist_id):
+    return render_template('pages/show_artist.html', artist=artist_detail(artist_id))
 
 
 #  ----------------------------------------------------------------
 #  Update
 #  ----------------------------------------------------------------
 
+# form field -> column; genres is a multi-select handled separately
+ARTIST_FIELDS = {
+    'name': 'name',
+    'city': 'city',
+    'state': 'state',
+    'phone': 'phone',
+    'facebook_link': 'facebook_link',
+    'image_link': 'image_link',
+    'website_link': 'website',
+    'seeking_venue': 'seeking_venue',
+    'seeking_description': 'seeking_description'
+}
+VENUE_FIELDS = dict(ARTIST_FIELDS, address='address', seeking_talent='seeking_talent')
+del VENUE_FIELDS['seeking_venue']
+
+
+def submitted_changes(form, fields):
+    # a PATCH only carries the fields being changed; a POST carries them all
+    partial = request.method == 'PATCH'
+    values = {}
+    for field, column in fields.items():
+        if not partial or field in request.form:
+            values[column] = getattr(form, field).data
+    if not partial or 'genres' in request.form:
+        values['genres'] = ",".join(request.form.getlist("genres"))
+    return values
+
+
+def check_version(instance):
+    # the version the edit form was rendered from
+    expected = request.form.get('version_id')
+    if expected and expected != str(instance.version_id):
+        raise StaleDataError(f"{instance!r} is at version {instance.version_id}, not {expected}")
+
+
+def failed_precondition(kind, instance):
+    # If-Match carries the ETag of a previous PATCH response; '*' matches any
+    # current version
+    if request.if_match and not request.if_match.contains(str(instance.version_id)):
+        message = f"{kind} is at version {instance.version_id}, which If-Match does not match."
+        return jsonify({'error': 'precondition failed', 'message': message}), 412
+    return None
+
+
+def version_conflict(kind, edit_view, entity_id):
+    message = f"{kind} was changed by someone else while you were editing. Review the current values and try again."
+    if request.method == 'PATCH':
+        return jsonify({'error': 'conflict', 'message': message}), 409
+    flash(message)
+    return edit_view(entity_id), 409
+
+
+def patched(kind, version):
+    # PATCH clients get the new version back to send as If-Match next time
+    if version is None:
+        return jsonify({'error': 'server_error', 'message': f"{kind} could not be updated."}), 500
+    response = jsonify({'version_id': version})
+    response.set_etag(str(version))
+    return response
+
 
 @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
@@ -314,37 +455,49 @@ def edit_artist(artist_id):
     form.website_link.data = artist.website
     form.seeking_venue.data = artist.seeking_venue
     form.seeking_description.data = artist.seeking_description
+    form.version_id.data = artist.version_id
 
     return render_template('forms/edit_artist.html', form=form, artist=artist)
 
 
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@app.route('/artists/<int:artist_id>/edit', methods=['POST', 'PATCH'])
 def edit_artist_submission(artist_id):
     form = ArtistForm(request.form)
-    genres_list = request.form.getlist("genres")
+    artist = Artist.query.get_or_404(artist_id)
+    failed = failed_precondition('Artist', artist)
+    if failed:
+        db.session.close()
+        return failed
+    conflict = False
+    version = None
     try:
-        artist = Artist.query.filter_by(id=artist_id).first()
-        artist.name = form.name.data
-        artist.city = form.city.data
-        artist.state = form.state.data
-        artist.phone = form.phone.data
-        artist.genres = ",".join(genres_list)
-        artist.facebook_link = form.facebook_link.data
-        artist.image_link = form.image_link.data
-        artist.website = form.website_link.data
-        artist.seeking_venue = form.seeking_venue.data
-        artist.seeking_description = form.seeking_description.data
-
-        db.session.commit()
-        # on successful db update, flash success
-        flash("Artist: " + request.form['name'] + " has been successfully updated!")
+        check_version(artist)
+        changed = apply_changes(artist, submitted_changes(form, ARTIST_FIELDS))
+        if changed:
+            # the flush bumps version_id; read it before the commit expires it
+            db.session.flush()
+        name, new_version = artist.name, artist.version_id
+        if changed:
+            artist.update()
+        if request.method == 'PATCH':
+            version = new_version
+        else:
+            # on successful db update, flash success
+            flash("Artist: " + name + " has been successfully updated!")
+    except StaleDataError:
+        db.session.rollback()
+        conflict = True
     except:
         db.session.rollback()
-        print(sys.exc_info())
+        app.logger.exception('Artist %s could not be updated', artist_id)
         # on unsuccessful db update, flash an error instead.
-        flash("An error occurred. Artist " + request.form['name'] + " not be updated!.")
+        flash("An error occurred. Artist " + request.form.get('name', str(artist_id)) + " not be updated!.")
     finally:
         db.session.close()
+    if conflict:
+        return version_conflict('Artist', edit_artist, artist_id)
+    if request.method == 'PATCH':
+        return patched('Artist', version)
     return redirect(url_for('show_artist', artist_id=artist_id))
 
 
@@ -364,37 +517,49 @@ def edit_venue(venue_id):
     form.website_link.data = venue.website
     form.seeking_talent.data = venue.seeking_talent
     form.seeking_description.data = venue.seeking_description
+    form.version_id.data = venue.version_id
 
     return render_template('forms/edit_venue.html', form=form, venue=venue)
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@app.route('/venues/<int:venue_id>/edit', methods=['POST', 'PATCH'])
 def edit_venue_submission(venue_id):
     form = VenueForm(request.form)
-    genres_list = request.form.getlist("genres")
+    venue = Venue.query.get_or_404(venue_id)
+    failed = failed_precondition('Venue', venue)
+    if failed:
+        db.session.close()
+        return failed
+    conflict = False
+    version = None
     try:
-        venue = Venue.query.filter_by(id=venue_id).first()
-        venue.name = form.name.data
-        venue.city = form.city.data
-        venue.state = form.state.data
-        venue.phone = form.phone.data
-        venue.genres = ",".join(genres_list)
-        venue.facebook_link = form.facebook_link.data
-        venue.image_link = form.image_link.data
-        venue.website = form.website_link.data
-        venue.seeking_talent = form.seeking_talent.data
-        venue.seeking_description = form.seeking_description.data
-
-        db.session.commit()
-        # on successful db update, flash success
-        flash("Venue: " + request.form['name'] + " has been successfully updated!")
+        check_version(venue)
+        changed = apply_changes(venue, submitted_changes(form, VENUE_FIELDS))
+        if changed:
+            # the flush bumps version_id; read it before the commit expires it
+            db.session.flush()
+        name, new_version = venue.name, venue.version_id
+        if changed:
+            venue.update()
+        if request.method == 'PATCH':
+            version = new_version
+        else:
+            # on successful db update, flash success
+            flash("Venue: " + name + " has been successfully updated!")
+    except StaleDataError:
+        db.session.rollback()
+        conflict = True
     except:
         db.session.rollback()
-        print(sys.exc_info())
+        app.logger.exception('Venue %s could not be updated', venue_id)
         # on unsuccessful db update, flash an error instead.
-        flash("An error occurred. Venue " + request.form['name'] + " not be updated!.")
+        flash("An error occurred. Venue " + request.form.get('name', str(venue_id)) + " not be updated!.")
     finally:
         db.session.close()
+    if conflict:
+        return version_conflict('Venue', edit_venue, venue_id)
+    if request.method == 'PATCH':
+        return patched('Venue', version)
     return redirect(url_for('show_venue', venue_id=venue_id))
 
 #  ----------------------------------------------------------------
@@ -441,7 +606,7 @@ def create_artist_submission():
         flash('Artist ' + request.form['name'] + ' was successfully listed!')
     except:
         db.session.rollback()
-        print(sys.exc_info())
+        app.logger.exception('Artist could not be listed')
         # on unsuccessful db insert, flash an error instead.
         flash("An error occurred. Artist " + request.form['name'] + " not Created.")
     finally:
@@ -453,20 +618,61 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 
-@app.route('/shows')
-def shows():
-    data = []
-    for i in db.session.query(Show).join(Artist).join(Venue).order_by('date').all():
-        items = {
+def listed_shows():
+    rows = (
+        db.session.query(Show.venue_id, Venue.name.label('venue_name'), Show.artist_id,
+                         Artist.name.label('artist_name'), Artist.image_link.label('artist_image_link'),
+                         Show.start_time)
+        .select_from(Show)
+        .join(Artist)
+        .join(Venue)
+        .order_by(Show.date)
+        .yield_per(app.config['LISTING_BATCH_SIZE'])
+    )
+    return (
+        {
             'venue_id': i.venue_id,
-            'venue_name': i.venue.name,
+            'venue_name': i.venue_name,
             'artist_id': i.artist_id,
-            'artist_name': i.artist.name,
-            'artist_image_link': i.artist.image_link,
+            'artist_name': i.artist_name,
+            'artist_image_link': i.artist_image_link,
             'start_time': i.start_time.strftime('%Y-%m-%d %H:%M:%S')
         }
-        data.append(items)
-    return render_template('pages/shows.html', shows=data)
+        for i in rows
+    )
+
+
+@app.route('/shows')
+def shows():
+    return stream_template('pages/shows.html', shows=listed_shows())
+
+
+@app.route('/stream/shows')
+def stream_shows():
+    try:
+        subscriber = show_events.subscribe(db.get_engine())
+    except show_events.TooManySubscribers:
+        return Response('Too many live update subscribers, retry later.\n', status=503,
+                        mimetype='text/plain', headers={'Retry-After': str(app.config['SHOW_EVENTS_KEEPALIVE'])})
+    keepalive = app.config['SHOW_EVENTS_KEEPALIVE']
+
+    def stream():
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    change = subscriber.get(timeout=keepalive)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                if change is None:
+                    return
+                yield f"event: {change['op']}\ndata: {json.dumps(change)}\n\n"
+        finally:
+            show_events.unsubscribe(subscriber)
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
 @app.route('/shows/create')
@@ -496,7 +702,7 @@ def create_show_submission():
         flash('Show was successfully listed!')
     except:
         db.session.rollback()
-        print(sys.exc_info())
+        app.logger.exception('Show could not be listed')
         # on unsuccessful db insert, flash an error instead.
         flash("An error occurred. Show could not be listed.")
     finally:
@@ -504,6 +710,183 @@ def create_show_submission():
         return render_template('pages/home.html')
 
 
+#  ----------------------------------------------------------------
+#  API
+#  ----------------------------------------------------------------
+
+
+@app.route('/api/changes')
+def api_changes():
+    limit = request.args.get('limit', app.config['CHANGES_PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, app.config['CHANGES_MAX_PAGE_SIZE']))
+    try:
+        feed = changes.get_changes(
+            since=request.args.get('since'),
+            limit=limit,
+            lag=app.config['CHANGES_LAG_SECONDS']
+        )
+    except changes.InvalidCursor:
+        return jsonify({'error': 'invalid cursor'}), 400
+    return jsonify(feed)
+
+
+@app.route('/api/metrics/search')
+def api_search_metrics():
+    return jsonify(search_cache.metrics.snapshot())
+
+
+#  ----------------------------------------------------------------
+#  Matches
+#  ----------------------------------------------------------------
+
+
+@app.route('/venues/<int:venue_id>/matches')
+def venue_matches(venue_id):
+    venue = Venue.query.get_or_404(venue_id)
+    matches = []
+    # matches are mutual: only a venue seeking talent is offered artists
+    if venue.seeking_talent:
+        since = datetime.now() - timedelta(days=app.config['MATCH_RECENT_DAYS'])
+        matches = matchmaker.artists_for_venue(venue, since)
+    return render_template('pages/matches.html', subject=venue, kind='artists', matches=matches,
+                           seeking=venue.seeking_talent)
+
+
+@app.route('/artists/<int:artist_id>/matches')
+def artist_matches(artist_id):
+    artist = Artist.query.get_or_404(artist_id)
+    matches = []
+    if artist.seeking_venue:
+        since = datetime.now() - timedelta(days=app.config['MATCH_RECENT_DAYS'])
+        matches = matchmaker.venues_for_artist(artist, since)
+    return render_template('pages/matches.html', subject=artist, kind='venues', matches=matches,
+                           seeking=artist.seeking_venue)
+
+#  ----------------------------------------------------------------
+#  Analytics
+#  ----------------------------------------------------------------
+
+
+@app.route('/analytics')
+def analytics_dashboard():
+    month = datetime.now()
+    if request.args.get('month'):
+        try:
+            month = datetime.strptime(request.args['month'], '%Y-%m')
+        except ValueError:
+            abort(400)
+    # the twelve months ending with the selected one
+    since = partitions.add_months(month, -11)
+    data = {
+        'month': month.strftime('%Y-%m'),
+        'busiest_venues': analytics.busiest_venues(month),
+        'top_genres': analytics.top_genres_by_city(),
+        'artist_bookings': analytics.artist_booking_frequency(since, month)
+    }
+    return render_template('pages/analytics.html', analytics=data)
+
+#  ----------------------------------------------------------------
+#  Admin
+#  ----------------------------------------------------------------
+
+
+@app.route('/admin/profiles')
+def admin_profiles():
+    if not profiling.is_admin(app):
+        abort(404)
+    profiles = profiling.slowest_profiles(app.config['PROFILE_DIR'])
+    return render_template('pages/profiles.html', profiles=profiles)
+
+
+@app.route('/admin/profiles/<endpoint>/<filename>')
+def admin_profile_file(endpoint, filename):
+    if not profiling.is_admin(app):
+        abort(404)
+    # endpoint comes from the URL; '..' would otherwise reach the app root
+    directory = safe_join(app.config['PROFILE_DIR'], endpoint)
+    if directory is None:
+        abort(404)
+    return send_from_directory(directory, filename, mimetype='text/plain')
+
+
+#  ----------------------------------------------------------------
+#  Read-only snapshot mode
+#  ----------------------------------------------------------------
+
+snapshots = snapshot.SnapshotReader(app.config['SNAPSHOT_PATH'], app.config['SNAPSHOT_CHECK_SECONDS'])
+
+
+def current_snapshot():
+    try:
+        return snapshots.current()
+    except FileNotFoundError:
+        app.logger.error('no catalogue snapshot at %s', snapshots.path)
+        abort(503)
+
+
+def snapshot_venues():
+    return render_template('pages/venues.html', areas=current_snapshot().page('venues'))
+
+
+def snapshot_venue(venue_id):
+    venue = current_snapshot().venue(venue_id)
+    if venue is None:
+        abort(404)
+    return render_template('pages/show_venue.html', venue=venue)
+
+
+def snapshot_artist(artist_id):
+    artist = current_snapshot().artist(artist_id)
+    if artist is None:
+        abort(404)
+    return render_template('pages/show_artist.html', artist=artist)
+
+
+def snapshot_search_venues():
+    throttle_search()
+    search_term = request.form.get('search_term', '')
+    response = current_snapshot().search_venues(search_term)
+    return render_template('pages/search_venues.html', results=response, search_term=search_term)
+
+
+def snapshot_search_artists():
+    throttle_search()
+    search_term = request.form.get('search_term', '')
+    response = current_snapshot().search_artists(search_term)
+    return render_template('pages/search_artists.html', results=response, search_term=search_term)
+
+
+def snapshot_artists():
+    return stream_template('pages/artists.html', artists=current_snapshot().artists())
+
+
+def snapshot_shows():
+    return stream_template('pages/shows.html', shows=current_snapshot().shows())
+
+
+SNAPSHOT_VIEWS = {
+    'venues': snapshot_venues,
+    'show_venue': snapshot_venue,
+    'search_venues': snapshot_search_venues,
+    'artists': snapshot_artists,
+    'show_artist': snapshot_artist,
+    'search_artists': snapshot_search_artists,
+    'shows': snapshot_shows,
+}
+# views that never touch the database
+DATABASE_FREE_VIEWS = {'index', 'static', 'api_search_metrics', 'admin_profiles', 'admin_profile_file'}
+
+
+@app.before_request
+def serve_from_snapshot():
+    if not app.config['READ_ONLY'] or request.endpoint in DATABASE_FREE_VIEWS:
+        return None
+    view = SNAPSHOT_VIEWS.get(request.endpoint)
+    if view is None:
+        abort(404 if request.method in ('GET', 'HEAD') else 405)
+    return view(**request.view_args)
+
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -514,16 +897,72 @@ def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter(
-            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+shows_cli = AppGroup('shows', help='Maintain the partitioned shows table.')
+
+
+@shows_cli.command('partition')
+@click.option('--months-ahead', default=12, help='Months of future partitions to keep ready.')
+def partition_shows(months_ahead):
+    partitions.convert_to_partitioned(months_ahead)
+    click.echo('shows converted to a partitioned table.')
+
+
+@shows_cli.command('maintain')
+@click.option('--months-ahead', default=12, help='Months of future partitions to keep ready.')
+@click.option('--archive-after', default=None, type=int, help='Archive partitions older than this many months.')
+@click.option('--tablespace', default=None, help='Move archived partitions here instead of detaching them.')
+def maintain_shows(months_ahead, archive_after, tablespace):
+    created = partitions.ensure_partitions(months_ahead)
+    archived = []
+    if archive_after is not None:
+        archived = partitions.archive_partitions(archive_after, tablespace)
+    db.session.commit()
+    click.echo('created: ' + (', '.join(created) or 'none'))
+    click.echo('archived: ' + (', '.join(archived) or 'none'))
+
+
+app.cli.add_command(shows_cli)
+
+analytics_cli = AppGroup('analytics', help='Maintain the analytics rollups.')
+
+
+@analytics_cli.command('rebuild')
+def rebuild_analytics():
+    analytics.rebuild()
+    click.echo('analytics rollups rebuilt.')
+
+
+app.cli.add_command(analytics_cli)
+
+assets_cli = AppGroup('assets', help='Build fingerprinted static assets.')
+
+
+@assets_cli.command('build')
+def build_assets():
+    manifest = assets.build(app.static_folder)
+    click.echo(f'{len(manifest)} assets written to {app.static_folder}.')
+
+
+app.cli.add_command(assets_cli)
+
+snapshot_cli = AppGroup('snapshot', help='Publish read-only catalogue snapshots.')
+
+
+@snapshot_cli.command('build')
+@click.option('--output', default=None, help='Snapshot file to publish (default: SNAPSHOT_PATH).')
+def build_snapshot(output):
+    path = output or app.config['SNAPSHOT_PATH']
+    counts = snapshot.build(path, venue_areas, venue_detail, artist_detail, listed_artists, listed_shows)
+    click.echo(f"snapshot of {counts['venues']} venues, {counts['artists']} artists "
+               f"and {counts['shows']} shows published to {path}.")
+
+
+app.cli.add_command(snapshot_cli)
+
 
 #----------------------------------------------------------------------------#
 # Launch.
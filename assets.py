@@ -0,0 +1,158 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import zlib
+from flask import request, send_from_directory
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# `flask assets build` writes a content-hashed copy of every static file next
+# to the original (css/main.css -> css/main.1a2b3c4d5e6f.css) with .gz and,
+# when brotli is installed, .br variants, and records the mapping in
+# static/manifest.json. Hashed names never change content, so they are served
+# with a far-future Cache-Control.
+
+MANIFEST_NAME = 'manifest.json'
+COMPRESSIBLE = ('.css', '.js', '.svg', '.html', '.json', '.txt', '.map', '.eot', '.ttf')
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+COMPRESSED_MIMETYPES = ('text/html', 'application/json')
+
+
+def hashed_name(path, content):
+    root, ext = os.path.splitext(path)
+    return f"{root}.{hashlib.sha256(content).hexdigest()[:12]}{ext}"
+
+
+def load_manifest(static_folder):
+    path = os.path.join(static_folder, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def build(static_folder):
+    old = load_manifest(static_folder)
+    generated = set()
+    for name in old.values():
+        generated.update({name, name + '.gz', name + '.br'})
+
+    manifest = {}
+    for root, _, names in os.walk(static_folder):
+        for name in names:
+            path = os.path.relpath(os.path.join(root, name), static_folder).replace(os.sep, '/')
+            if path == MANIFEST_NAME or path in generated or path.endswith(('.gz', '.br')):
+                continue
+            with open(os.path.join(static_folder, path), 'rb') as f:
+                content = f.read()
+            target = hashed_name(path, content)
+            with open(os.path.join(static_folder, target), 'wb') as f:
+                f.write(content)
+            if path.endswith(COMPRESSIBLE):
+                with open(os.path.join(static_folder, target + '.gz'), 'wb') as f:
+                    f.write(gzip.compress(content, 9))
+                if brotli is not None:
+                    with open(os.path.join(static_folder, target + '.br'), 'wb') as f:
+                        f.write(brotli.compress(content))
+            manifest[path] = target
+
+    # drop hashed files from the previous build that are no longer referenced
+    current = set(manifest.values())
+    for name in generated:
+        stale = name.removesuffix('.gz').removesuffix('.br') not in current
+        if stale and os.path.exists(os.path.join(static_folder, name)):
+            os.remove(os.path.join(static_folder, name))
+
+    with open(os.path.join(static_folder, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def gzip_stream(chunks, level):
+    # one gzip member across the whole body; each chunk is sync-flushed so
+    # the client can render it before the rest has been produced
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def accepts(encoding):
+    # 'gzip;q=0' is listed in the header but refuses gzip
+    return request.accept_encodings[encoding] > 0
+
+
+def encoded(response, encoding):
+    # a strong ETag names the exact bytes; the re-encoded body only keeps
+    # the meaning of the original
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+
+
+def init_assets(app):
+    manifest = load_manifest(app.static_folder)
+    hashed = set(manifest.values())
+    max_age = app.config['STATIC_MAX_AGE']
+
+    @app.url_defaults
+    def hashed_static_url(endpoint, values):
+        # url_for('static', filename='css/main.css') resolves to the hashed copy
+        if endpoint == 'static' and values.get('filename') in manifest:
+            values['filename'] = manifest[values['filename']]
+
+    def static(filename):
+        if filename not in hashed:
+            return app.send_static_file(filename)
+        for encoding, suffix in ENCODINGS:
+            if accepts(encoding) and os.path.exists(os.path.join(app.static_folder, filename + suffix)):
+                response = send_from_directory(
+                    app.static_folder, filename + suffix,
+                    mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                    max_age=max_age)
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(app.static_folder, filename, max_age=max_age)
+        response.headers['Cache-Control'] = f'public, max-age={max_age}, immutable'
+        response.vary.add('Accept-Encoding')
+        return response
+
+    app.view_functions['static'] = static
+
+    @app.after_request
+    def compress_response(response):
+        if (response.status_code != 200
+                or response.direct_passthrough
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSED_MIMETYPES
+                or not accepts('gzip')):
+            return response
+        if response.is_streamed:
+            # the length is unknown up front, so streamed pages are always
+            # compressed, chunk by chunk as they render
+            response.response = gzip_stream(response.response, app.config['COMPRESS_LEVEL'])
+            response.headers.pop('Content-Length', None)
+            encoded(response, 'gzip')
+            return response
+        data = response.get_data()
+        if len(data) < app.config['COMPRESS_MIN_SIZE']:
+            return response
+        response.set_data(gzip.compress(data, app.config['COMPRESS_LEVEL']))
+        encoded(response, 'gzip')
+        return response
@@ -0,0 +1,70 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+
+# Shared setup for the benchmark scripts: each one builds the schema from
+# models.py in its own Postgres schema of DATABASE_URL and seeds it with
+# generate_series, so the numbers are reproducible on any local Postgres.
+# Run them from the repository root, e.g. `python benchmarks/listings.py`.
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SHOW_EVENTS_BACKEND', 'local')
+
+GENRES = ['Jazz', 'Reggae', 'Swing', 'Classical', 'Folk', 'R&B', 'Hip-Hop', 'Rock n Roll',
+          'Blues', 'Country', 'Electronic', 'Funk', 'Pop', 'Punk', 'Soul', 'Alternative']
+
+
+def bench_app(schema):
+    from app import app
+    app.config.update(
+        TESTING=True,
+        WTF_CSRF_ENABLED=False,
+        SQLALCHEMY_ENGINE_OPTIONS={'connect_args': {'options': f'-csearch_path={schema}'}},
+    )
+    return app
+
+
+def reset_schema(schema):
+    engine = create_engine(os.environ['DATABASE_URL'])
+    with engine.begin() as connection:
+        connection.execute(text(f'DROP SCHEMA IF EXISTS {schema} CASCADE'))
+        connection.execute(text(f'CREATE SCHEMA {schema}'))
+    engine.dispose()
+
+
+def create_catalogue(app, venues, artists, shows, months_back=12, months_ahead=12):
+    # `shows` rows spread evenly from `months_back` months ago to
+    # `months_ahead` months from now
+    import analytics
+    import partitions
+    from models import db
+    with app.app_context():
+        db.create_all()
+        partitions.create_default_partition()
+        partitions.ensure_partitions(months_ahead=months_ahead,
+                                      since=datetime.now() - timedelta(days=31 * months_back))
+        genres = "(ARRAY[" + ", ".join(f"'{genre}'" for genre in GENRES) + "])"
+        db.session.execute(text(
+            "INSERT INTO venues (name, city, state, address, phone, website, genres, seeking_talent) "
+            "SELECT 'Venue ' || i, 'City ' || i % 200, 'S' || i % 50, i || ' Main Street', '555-0100', "
+            f"'https://venue' || i || '.example.com', {genres}[1 + i % 16] || ',' || {genres}[1 + i % 7], "
+            "i % 3 <> 0 FROM generate_series(1, :n) AS i"
+        ), {'n': venues})
+        db.session.execute(text(
+            "INSERT INTO artists (name, city, state, phone, genres, seeking_venue) "
+            "SELECT 'Artist ' || i, 'City ' || i % 200, 'S' || i % 50, '555-0101', "
+            f"{genres}[1 + i % 16] || ',' || {genres}[1 + i % 5], i % 2 = 0 "
+            "FROM generate_series(1, :n) AS i"
+        ), {'n': artists})
+        db.session.execute(text(
+            "INSERT INTO shows (venue_id, artist_id, date, start_time) "
+            "SELECT 1 + i % :venues, 1 + (i * 7) % :artists, now(), "
+            "date_trunc('hour', now()) + ((i % (:back + :ahead)) - :back) * interval '1 day' "
+            "FROM generate_series(1, :n) AS i"
+        ), {'n': shows, 'venues': venues, 'artists': artists, 'back': 30 * months_back, 'ahead': 30 * months_ahead})
+        db.session.execute(text('ANALYZE'))
+        db.session.commit()
+        analytics.rebuild()
+        db.session.remove()
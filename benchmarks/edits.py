@@ -0,0 +1,89 @@
+import argparse
+
+from sqlalchemy import select, text, update
+
+from common import bench_app, create_catalogue, reset_schema
+
+# WAL volume of an artist edit: an UPDATE that rewrites every column (what a
+# form save sent before apply_changes), one that sets only the column that
+# changed, and a save that changed nothing, which apply_changes turns into no
+# UPDATE at all. Each edit commits on its own, like a request does. Reports
+# WAL bytes per edit from pg_current_wal_lsn() and the share of HOT updates,
+# which skip the index writes. Postgres writes a whole new row version either
+# way, so the first two differ little; the saving is in the no-op saves.
+#
+#   python benchmarks/edits.py --edits 5000
+
+SCHEMA = 'bench_edits'
+
+
+def wal_lsn(session):
+    return session.execute(text('SELECT pg_current_wal_lsn()')).scalar()
+
+
+def hot_updates(session):
+    return session.execute(text(
+        "SELECT n_tup_upd, n_tup_hot_upd FROM pg_stat_user_tables "
+        "WHERE schemaname = current_schema() AND relname = 'artists'"
+    )).one()
+
+
+def run(session, artists, ids, values_for):
+    # both runs start from a checkpoint, so each pays the same full-page
+    # images on the first write to a page
+    session.execute(text('CHECKPOINT'))
+    session.execute(text('SELECT pg_stat_clear_snapshot()'))
+    updated, hot = hot_updates(session)
+    start = wal_lsn(session)
+    for artist_id in ids:
+        row = session.execute(select(artists).where(artists.c.id == artist_id)).mappings().one()
+        values = values_for(row)
+        if values:
+            session.execute(update(artists).where(artists.c.id == artist_id).values(
+                version_id=row['version_id'] + 1, **values))
+        session.commit()
+    wal = session.execute(text('SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), :start)'), {'start': start}).scalar()
+    # the statistics collector reports with a delay; wait for it to catch up
+    session.execute(text('SELECT pg_sleep(1), pg_stat_clear_snapshot()'))
+    updated_after, hot_after = hot_updates(session)
+    return float(wal) / len(ids), (hot_after - hot) / max(updated_after - updated, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--artists', type=int, default=100000)
+    parser.add_argument('--venues', type=int, default=10000)
+    parser.add_argument('--shows', type=int, default=100000)
+    parser.add_argument('--edits', type=int, default=5000)
+    args = parser.parse_args()
+
+    app = bench_app(SCHEMA)
+    reset_schema(SCHEMA)
+    create_catalogue(app, args.venues, args.artists, args.shows)
+
+    from models import db, Artist
+    artists = Artist.__table__
+    written = [column.name for column in artists.columns if column.name not in ('id', 'version_id', 'updated_at')]
+    # each run edits its own third of the table, spread over its pages
+    third = args.artists // 3
+    step = max(third // args.edits, 1)
+    full_ids = list(range(1, third + 1, step))[:args.edits]
+    changed_ids = [third + artist_id for artist_id in full_ids]
+    unchanged_ids = [2 * third + artist_id for artist_id in full_ids]
+
+    with app.app_context():
+        runs = (
+            ('full row', full_ids,
+             lambda row: dict({name: row[name] for name in written}, phone='555-0199')),
+            ('changed only', changed_ids,
+             lambda row: {'phone': '555-0199'}),
+            ('unchanged', unchanged_ids,
+             lambda row: {}),
+        )
+        for label, ids, values_for in runs:
+            per_edit, hot = run(db.session, artists, ids, values_for)
+            print(f"{label:13} {per_edit:8.0f} WAL bytes/edit  {hot:6.1%} HOT  ({len(ids)} edits)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+from common import bench_app, create_catalogue, reset_schema
+
+# Time to first byte and peak RSS of /shows and /artists in three variants:
+# the original views (lazy-loaded relationships, one query per row), the
+# current single-query listed_shows()/listed_artists() rendered into one
+# string with render_template, and the current streamed views. The buffered
+# variant separates the gain from removing the N+1 queries from the gain from
+# streaming. Each measurement runs in a fresh process so ru_maxrss is that
+# variant's own peak.
+#
+#   python benchmarks/listings.py --shows 200000 --artists 100000
+
+SCHEMA = 'bench_listings'
+
+
+def baseline_views(app):
+    from flask import render_template
+    import app as app_module
+    from models import db, Artist, Venue, Show
+
+    def lazy_shows():
+        data = []
+        for i in db.session.query(Show).join(Artist).join(Venue).order_by('date').all():
+            data.append({
+                'venue_id': i.venue_id,
+                'venue_name': i.venue.name,
+                'artist_id': i.artist_id,
+                'artist_name': i.artist.name,
+                'artist_image_link': i.artist.image_link,
+                'start_time': i.start_time.strftime('%Y-%m-%d %H:%M:%S')
+            })
+        return render_template('pages/shows.html', shows=data)
+
+    def lazy_artists():
+        data = [{"id": artist.id, "name": artist.name} for artist in Artist.query.order_by("id").all()]
+        return render_template('pages/artists.html', artists=data)
+
+    def buffered_shows():
+        return render_template('pages/shows.html', shows=list(app_module.listed_shows()))
+
+    def buffered_artists():
+        return render_template('pages/artists.html', artists=list(app_module.listed_artists()))
+
+    app.add_url_rule('/lazy/shows', 'lazy_shows', lazy_shows)
+    app.add_url_rule('/lazy/artists', 'lazy_artists', lazy_artists)
+    app.add_url_rule('/buffered/shows', 'buffered_shows', buffered_shows)
+    app.add_url_rule('/buffered/artists', 'buffered_artists', buffered_artists)
+
+
+def measure(path):
+    app = bench_app(SCHEMA)
+    baseline_views(app)
+    client = app.test_client()
+    start = time.perf_counter()
+    response = client.get(path, buffered=False)
+    chunks = iter(response.response)
+    size = len(next(chunks))
+    first_byte = time.perf_counter() - start
+    for chunk in chunks:
+        size += len(chunk)
+    total = time.perf_counter() - start
+    response.close()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {'path': path, 'ttfb_ms': round(first_byte * 1000, 1), 'total_ms': round(total * 1000, 1),
+            'bytes': size, 'peak_rss_mb': round(peak / 1024, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shows', type=int, default=200000)
+    parser.add_argument('--artists', type=int, default=100000)
+    parser.add_argument('--venues', type=int, default=5000)
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure)))
+        return
+
+    reset_schema(SCHEMA)
+    create_catalogue(bench_app(SCHEMA), args.venues, args.artists, args.shows)
+    for listing in ('shows', 'artists'):
+        for variant in ('lazy', 'buffered', 'streamed'):
+            path = f'/{listing}' if variant == 'streamed' else f'/{variant}/{listing}'
+            output = subprocess.run([sys.executable, __file__, '--measure', path],
+                                    check=True, capture_output=True, text=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{listing:8} {variant:9} ttfb {result['ttfb_ms']:>8} ms  total {result['total_ms']:>8} ms  "
+                  f"peak rss {result['peak_rss_mb']:>7} MB")
+
+
+if __name__ == '__main__':
+    main()
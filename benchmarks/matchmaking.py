@@ -0,0 +1,57 @@
+import argparse
+import statistics
+import time
+
+from common import bench_app, create_catalogue, reset_schema
+
+# Matchmaking latency at catalogue scale: the cold index load, then warm
+# /venues/<id>/matches and /artists/<id>/matches requests (index lookups plus
+# the rollup read for the shortlist, rendered through the real route).
+#
+#   python benchmarks/matchmaking.py --artists 100000
+
+SCHEMA = 'bench_matchmaking'
+
+
+def timed(client, url):
+    start = time.perf_counter()
+    response = client.get(url)
+    assert response.status_code == 200, response.status_code
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--artists', type=int, default=100000)
+    parser.add_argument('--venues', type=int, default=10000)
+    parser.add_argument('--shows', type=int, default=500000)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    app = bench_app(SCHEMA)
+    reset_schema(SCHEMA)
+    create_catalogue(app, args.venues, args.artists, args.shows)
+
+    import app as app_module
+    client = app.test_client()
+    with app.app_context():
+        start = time.perf_counter()
+        app_module.matchmaker.artists.refresh(force=True)
+        app_module.matchmaker.venues.refresh(force=True)
+        print(f"index load       {(time.perf_counter() - start) * 1000:8.1f} ms  "
+              f"({len(app_module.matchmaker.artists.entries)} artists, "
+              f"{len(app_module.matchmaker.venues.entries)} venues seeking)")
+
+    # the catalogue marks every venue not divisible by 3 and every even
+    # artist as seeking
+    venues = [i for i in range(1, args.venues + 1) if i % 3][:args.requests]
+    artists = [i for i in range(2, args.artists + 1, 2)][:args.requests]
+    for label, urls in (('venue matches', [f'/venues/{i}/matches' for i in venues]),
+                        ('artist matches', [f'/artists/{i}/matches' for i in artists])):
+        runs = sorted(timed(client, url) for url in urls)
+        print(f"{label:16} median {statistics.median(runs):6.1f} ms  "
+              f"p95 {runs[int(len(runs) * 0.95) - 1]:6.1f} ms  max {runs[-1]:6.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+import argparse
+import json
+import statistics
+
+from sqlalchemy import text
+
+from common import bench_app, create_catalogue, reset_schema
+
+# Partition pruning: the same queries against the partitioned shows table and
+# an unpartitioned copy of it (shows_heap, with the same indexes). The seed
+# follows the production shape: `--years` of history and 12 months of
+# upcoming shows. Reports the median execution time from EXPLAIN ANALYZE and
+# how many tables were actually scanned.
+#
+#   python benchmarks/partitions.py --shows 20000000 --years 5
+
+SCHEMA = 'bench_partitions'
+QUERIES = {
+    'venue upcoming': "SELECT * FROM {table} WHERE venue_id = 42 AND start_time > now()",
+    'artist past': "SELECT * FROM {table} WHERE artist_id = 42 AND start_time < now()",
+    'count upcoming': "SELECT count(*) FROM {table} WHERE start_time > now()",
+    'next month': "SELECT count(*) FROM {table} "
+                  "WHERE start_time >= date_trunc('month', now()) + interval '1 month' "
+                  "AND start_time < date_trunc('month', now()) + interval '2 months'",
+}
+
+
+def scanned(plan):
+    # partitions pruned at run time stay in the plan but are never executed
+    found = set()
+    if 'Relation Name' in plan and plan.get('Actual Loops'):
+        found.add(plan['Relation Name'])
+    for child in plan.get('Plans', ()):
+        found |= scanned(child)
+    return found
+
+
+def explain(session, sql):
+    result = session.execute(text(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}")).scalar()
+    if isinstance(result, str):
+        result = json.loads(result)
+    return result[0]['Execution Time'], len(scanned(result[0]['Plan']))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shows', type=int, default=20000000)
+    parser.add_argument('--venues', type=int, default=20000)
+    parser.add_argument('--artists', type=int, default=100000)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = bench_app(SCHEMA)
+    reset_schema(SCHEMA)
+    create_catalogue(app, args.venues, args.artists, args.shows,
+                     months_back=args.years * 12, months_ahead=12)
+
+    from models import db
+    with app.app_context():
+        db.session.execute(text("CREATE TABLE shows_heap (LIKE shows INCLUDING DEFAULTS)"))
+        db.session.execute(text("INSERT INTO shows_heap SELECT * FROM shows"))
+        db.session.execute(text("ALTER TABLE shows_heap ADD PRIMARY KEY (id, start_time)"))
+        db.session.execute(text("CREATE INDEX ON shows_heap (venue_id, start_time)"))
+        db.session.execute(text("CREATE INDEX ON shows_heap (artist_id, start_time)"))
+        db.session.execute(text("ANALYZE shows_heap"))
+        db.session.commit()
+
+        partition_count = db.session.execute(text(
+            "SELECT count(*) FROM pg_inherits WHERE inhparent = 'shows'::regclass")).scalar()
+        past, upcoming = db.session.execute(text(
+            "SELECT count(*) FILTER (WHERE start_time < now()), count(*) FILTER (WHERE start_time >= now()) "
+            "FROM shows")).one()
+        print(f"shows: {past} past, {upcoming} upcoming, {partition_count} partitions")
+
+        for name, query in QUERIES.items():
+            for table in ('shows_heap', 'shows'):
+                runs = [explain(db.session, query.format(table=table)) for _ in range(args.repeat + 1)][1:]
+                median = statistics.median(ms for ms, _ in runs)
+                scanned_of = f"of {partition_count}" if table == 'shows' else "of 1"
+                print(f"{name:15} {table:11} {median:>9.2f} ms  {runs[0][1]:>3} {scanned_of:>6} tables scanned")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+import base64
+from datetime import datetime, timedelta
+from sqlalchemy import column, func, literal, or_, table, tuple_, union_all, select
+from models import db, Venue, Artist, Show, Tombstone
+
+# Incremental change feed. Every venue, artist, show and tombstone row is a
+# change keyed by (changed_at, kind, id); clients page through the feed in
+# that order and keep the cursor of the last change they applied.
+
+UPSERT_MODELS = {'venue': Venue, 'artist': Artist, 'show': Show}
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(changed_at, kind, row_id):
+    raw = f"{changed_at.isoformat()}|{kind}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        changed_at, kind, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(changed_at), kind, int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(cursor) from e
+
+
+def change_rows():
+    selects = [
+        select(model.updated_at.label('changed_at'), literal(kind).label('kind'), model.id.label('row_id'))
+        for kind, model in UPSERT_MODELS.items()
+    ]
+    selects.append(
+        select(Tombstone.deleted_at.label('changed_at'), literal('tombstone').label('kind'), Tombstone.id.label('row_id'))
+    )
+    return union_all(*selects).subquery()
+
+
+def oldest_open_transaction():
+    # Rows are stamped with now(), the start of their transaction, but only
+    # become visible when it commits. Changes at or after the start of the
+    # oldest transaction still open in another session of this application
+    # (same database and application_name) are held back until it ends, so a
+    # cursor never moves past a row that has yet to commit.
+    activity = table('pg_stat_activity', column('pid'), column('datname'),
+                     column('application_name'), column('xact_start'))
+    return (
+        select(func.min(activity.c.xact_start))
+        .where(activity.c.datname == func.current_database(),
+               activity.c.application_name == func.current_setting('application_name'),
+               activity.c.pid != func.pg_backend_pid())
+        .scalar_subquery()
+    )
+
+
+def get_changes(since=None, limit=100, lag=0):
+    rows = change_rows()
+    query = select(rows.c.changed_at, rows.c.kind, rows.c.row_id)
+    if since:
+        query = query.where(tuple_(rows.c.changed_at, rows.c.kind, rows.c.row_id) > tuple_(*decode_cursor(since)))
+    oldest = oldest_open_transaction()
+    query = query.where(or_(oldest.is_(None), rows.c.changed_at < oldest))
+    if lag:
+        # also hold back the newest changes from sessions the gate above
+        # cannot see. The stamps come from the database clock, so the cutoff
+        # does too.
+        query = query.where(rows.c.changed_at <= func.now() - timedelta(seconds=lag))
+    query = query.order_by(rows.c.changed_at, rows.c.kind, rows.c.row_id).limit(limit + 1)
+    page = db.session.execute(query).all()
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    # one query per kind for the payloads rather than one per change
+    ids = {}
+    for row in page:
+        ids.setdefault(row.kind, []).append(row.row_id)
+    records = {}
+    for kind, model in UPSERT_MODELS.items():
+        if kind in ids:
+            for item in model.query.filter(model.id.in_(ids[kind])).all():
+                records[(kind, item.id)] = item
+    if 'tombstone' in ids:
+        for item in Tombstone.query.filter(Tombstone.id.in_(ids['tombstone'])).all():
+            records[('tombstone', item.id)] = item
+
+    changes = []
+    for row in page:
+        item = records.get((row.kind, row.row_id))
+        if item is None:
+            continue
+        if row.kind == 'tombstone':
+            changes.append({'op': 'delete', 'type': item.entity, 'id': item.entity_id,
+                            'changed_at': row.changed_at.isoformat()})
+        else:
+            changes.append({'op': 'upsert', 'type': row.kind, 'id': row.row_id,
+                            'changed_at': row.changed_at.isoformat(), 'data': item.format()})
+
+    next_cursor = since
+    if page:
+        last = page[-1]
+        next_cursor = encode_cursor(last.changed_at, last.kind, last.row_id)
+    return {'changes': changes, 'next_cursor': next_cursor, 'has_more': has_more}
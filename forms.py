@@ -1,6 +1,6 @@
 from datetime import datetime
 from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, HiddenField
 from wtforms.validators import DataRequired, AnyOf, URL
 
 class ShowForm(Form):
@@ -122,6 +122,8 @@ class VenueForm(Form):
 
     seeking_talent = BooleanField( 'seeking_talent' )
 
+    version_id = HiddenField( 'version_id' )
+
     seeking_description = StringField(
         'seeking_description'
     )
@@ -233,6 +235,8 @@ class ArtistForm(Form):
 
     seeking_venue = BooleanField( 'seeking_venue' )
 
+    version_id = HiddenField( 'version_id' )
+
     seeking_description = StringField(
             'seeking_description'
      )
@@ -0,0 +1,146 @@
+import heapq
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from models import db, Venue, Artist, Tombstone, VenueMonthlyShows, ArtistMonthlyBookings
+
+# Venue/artist matchmaking. Each worker keeps an inverted index (genre -> ids,
+# city/state -> ids) of the venues seeking talent and the artists seeking
+# venues. The index is loaded once and then kept current from updated_at and
+# the tombstones, so a match only scores the rows sharing a genre or a city.
+# Like /api/changes, a refresh only moves its cursor up to `lag` seconds
+# before the database clock: a transaction stamped before the cursor that
+# commits after the refresh is still read by the next one.
+
+GENRE_WEIGHT = 1.0
+SAME_CITY_WEIGHT = 2.0
+SAME_STATE_WEIGHT = 0.5
+RECENT_SHOW_WEIGHT = 0.1
+RECENT_SHOW_CAP = 10
+
+
+def genre_set(genres):
+    return frozenset(genre.strip() for genre in (genres or '').split(',') if genre.strip())
+
+
+class CandidateIndex:
+    def __init__(self, model, kind, seeking, refresh_interval, lag):
+        self.model = model
+        self.kind = kind
+        self.seeking = seeking
+        self.refresh_interval = refresh_interval
+        self.lag = lag
+        self.entries = {}
+        self.by_genre = {}
+        self.by_location = {}
+        self.by_state = {}
+        self.cursor = None
+        self.last_refresh = 0
+        self._lock = threading.Lock()
+
+    def _remove(self, entity_id):
+        entry = self.entries.pop(entity_id, None)
+        if entry is None:
+            return
+        for genre in entry['genres']:
+            self.by_genre[genre].discard(entity_id)
+        self.by_location[(entry['city'], entry['state'])].discard(entity_id)
+        self.by_state[entry['state']].discard(entity_id)
+
+    def _add(self, row):
+        self._remove(row.id)
+        if not getattr(row, self.seeking):
+            return
+        entry = {'id': row.id, 'name': row.name, 'city': row.city, 'state': row.state,
+                 'image_link': row.image_link, 'genres': genre_set(row.genres)}
+        self.entries[row.id] = entry
+        for genre in entry['genres']:
+            self.by_genre.setdefault(genre, set()).add(row.id)
+        self.by_location.setdefault((row.city, row.state), set()).add(row.id)
+        self.by_state.setdefault(row.state, set()).add(row.id)
+
+    def refresh(self, force=False):
+        with self._lock:
+            if not force and time.monotonic() - self.last_refresh < self.refresh_interval:
+                return
+            # rows changed after the cursor are read again on the next
+            # refresh; re-adding and re-removing them is idempotent.
+            settled = db.session.query(db.func.localtimestamp() - timedelta(seconds=self.lag)).scalar()
+            model = self.model
+            query = db.session.query(
+                model.id, model.name, model.city, model.state, model.image_link,
+                model.genres, getattr(model, self.seeking)
+            )
+            if self.cursor is not None:
+                query = query.filter(model.updated_at >= self.cursor)
+            for row in query.all():
+                self._add(row)
+            # the first load only sees rows that still exist
+            if self.cursor is not None:
+                tombstones = Tombstone.query.filter(Tombstone.entity == self.kind,
+                                                    Tombstone.deleted_at >= self.cursor)
+                for tombstone in tombstones.all():
+                    self._remove(tombstone.entity_id)
+            self.cursor = settled
+            self.last_refresh = time.monotonic()
+
+    def rank(self, genres, city, state, count):
+        # the `count` best (score, entry) pairs. Shared genres are counted in
+        # C by Counter; the location bonuses only touch the much smaller city
+        # and state buckets, and only the best candidates are ordered.
+        with self._lock:
+            shared = Counter()
+            for genre in genres:
+                shared.update(self.by_genre.get(genre, ()))
+            same_city = self.by_location.get((city, state), set())
+            bonus = dict.fromkeys(self.by_state.get(state, ()), SAME_STATE_WEIGHT)
+            for entity_id in same_city:
+                bonus[entity_id] += SAME_CITY_WEIGHT
+            candidates = set(shared).union(same_city)
+
+            def score(entity_id):
+                return shared[entity_id] * GENRE_WEIGHT + bonus.get(entity_id, 0)
+
+            best = heapq.nsmallest(count, candidates, key=lambda entity_id: (-score(entity_id), entity_id))
+            return [(score(entity_id), self.entries[entity_id]) for entity_id in best]
+
+
+class Matchmaker:
+    def __init__(self, refresh_interval=30, lag=2):
+        self.venues = CandidateIndex(Venue, 'venue', 'seeking_talent', refresh_interval, lag)
+        self.artists = CandidateIndex(Artist, 'artist', 'seeking_venue', refresh_interval, lag)
+
+    def _recent_shows(self, rollup, column, ids, since):
+        if not ids:
+            return {}
+        rows = (
+            db.session.query(column, db.func.sum(rollup.show_count))
+            .filter(column.in_(ids))
+            .filter(rollup.month >= since)
+            .group_by(column)
+            .all()
+        )
+        return dict(rows)
+
+    def _top(self, shortlist, rollup, column, since, limit):
+        recent = self._recent_shows(rollup, column, [entry['id'] for _, entry in shortlist], since)
+        ranked = []
+        for score, entry in shortlist:
+            shows = recent.get(entry['id']) or 0
+            score += min(shows, RECENT_SHOW_CAP) * RECENT_SHOW_WEIGHT
+            ranked.append(dict(entry, genres=sorted(entry['genres']), score=round(score, 2), recent_shows=shows))
+        ranked.sort(key=lambda item: (-item['score'], item['id']))
+        return ranked[:limit]
+
+    def artists_for_venue(self, venue, since, limit=20):
+        self.artists.refresh()
+        # booking history only reorders the strongest candidates, so it is
+        # fetched for a shortlist instead of every scored row.
+        shortlist = self.artists.rank(genre_set(venue.genres), venue.city, venue.state, limit * 5)
+        return self._top(shortlist, ArtistMonthlyBookings, ArtistMonthlyBookings.artist_id, since, limit)
+
+    def venues_for_artist(self, artist, since, limit=20):
+        self.venues.refresh()
+        shortlist = self.venues.rank(genre_set(artist.genres), artist.city, artist.state, limit * 5)
+        return self._top(shortlist, VenueMonthlyShows, VenueMonthlyShows.venue_id, since, limit)
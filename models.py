@@ -1,4 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
 
 db = SQLAlchemy()
 
@@ -20,6 +22,13 @@ class Venue(db.Model):
     seeking_talent = db.Column(db.Boolean)
     seeking_description = db.Column(db.String(500))
     website = db.Column(db.String(500), nullable=False)
+    # optimistic concurrency: every UPDATE checks and bumps version_id
+    version_id = db.Column(db.Integer, nullable=False, server_default="1")
+    __mapper_args__ = {"version_id_col": version_id}
+    created_at = db.Column(db.DateTime, nullable=False, index=True,
+                           server_default=db.func.now())
+    updated_at = db.Column(db.DateTime, nullable=False, index=True,
+                           server_default=db.func.now(), onupdate=db.func.now())
     # Done: implement any missing fields, as a database migration using Flask-Migrate
 
     def add(self):
@@ -27,13 +36,28 @@ class Venue(db.Model):
         db.session.commit()
 
     def update(self):
-        db.session.update(self)
         db.session.commit()
 
     def delete(self):
         db.session.delete(self)
         db.session.commit()
 
+    def format(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "city": self.city,
+            "state": self.state,
+            "address": self.address,
+            "phone": self.phone,
+            "genres": self.genres.split(",") if self.genres else [],
+            "image_link": self.image_link,
+            "facebook_link": self.facebook_link,
+            "website": self.website,
+            "seeking_talent": self.seeking_talent,
+            "seeking_description": self.seeking_description,
+        }
+
     def __repr__(self):
         return f"<Venue {self.name}>"
 
@@ -54,6 +78,13 @@ class Artist(db.Model):
     seeking_venue = db.Column(db.Boolean)
     seeking_description = db.Column(db.String(500))
     website = db.Column(db.String(120))
+    # optimistic concurrency: every UPDATE checks and bumps version_id
+    version_id = db.Column(db.Integer, nullable=False, server_default="1")
+    __mapper_args__ = {"version_id_col": version_id}
+    created_at = db.Column(db.DateTime, nullable=False, index=True,
+                           server_default=db.func.now())
+    updated_at = db.Column(db.DateTime, nullable=False, index=True,
+                           server_default=db.func.now(), onupdate=db.func.now())
     # Done: implement any missing fields, as a database migration using Flask-Migrate
 
     def add(self):
@@ -61,38 +92,150 @@ class Artist(db.Model):
         db.session.commit()
 
     def update(self):
-        db.session.update(self)
         db.session.commit()
 
     def delete(self):
         db.session.delete(self)
         db.session.commit()
 
+    def format(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "city": self.city,
+            "state": self.state,
+            "phone": self.phone,
+            "genres": self.genres.split(",") if self.genres else [],
+            "image_link": self.image_link,
+            "facebook_link": self.facebook_link,
+            "website": self.website,
+            "seeking_venue": self.seeking_venue,
+            "seeking_description": self.seeking_description,
+        }
+
     def __repr__(self):
         return f"<Artist {self.name}>"
 
 
 class Show(db.Model):
     __tablename__ = "shows"
-    id = db.Column(db.Integer, primary_key=True)
+    # shows is range partitioned by start_time month (see partitions.py), so
+    # the partition key has to be part of the primary key.
+    __table_args__ = (
+        db.Index("ix_shows_venue_id_start_time", "venue_id", "start_time"),
+        db.Index("ix_shows_artist_id_start_time", "artist_id", "start_time"),
+        {"postgresql_partition_by": "RANGE (start_time)"},
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     date = db.Column(db.DateTime, nullable=False)
     artist_id = db.Column(db.Integer, db.ForeignKey(
         "artists.id"), nullable=False)
     venue_id = db.Column(db.Integer, db.ForeignKey(
         "venues.id"), nullable=False)
-    start_time = db.Column(db.DateTime, nullable=False)
+    start_time = db.Column(db.DateTime, primary_key=True, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, index=True,
+                           server_default=db.func.now())
+    updated_at = db.Column(db.DateTime, nullable=False, index=True,
+                           server_default=db.func.now(), onupdate=db.func.now())
 
     def add(self):
         db.session.add(self)
         db.session.commit()
 
     def update(self):
-        db.session.update(self)
         db.session.commit()
 
     def delete(self):
         db.session.delete(self)
         db.session.commit()
 
+    def format(self):
+        return {
+            "id": self.id,
+            "artist_id": self.artist_id,
+            "venue_id": self.venue_id,
+            "start_time": self.start_time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+
     def __repr__(self):
         return f"<Show of artist with id: {self.artist_id} and venue with id: {self.venue_id}>"
+
+
+def blank_to_none(value):
+    return None if value == '' else value
+
+
+def apply_changes(instance, values):
+    # assigns only the columns whose value differs, so an unchanged save
+    # issues no UPDATE and a partial one writes only what changed. Forms
+    # submit empty fields as '', which counts as unchanged against NULL.
+    changed = []
+    for column, value in values.items():
+        if blank_to_none(getattr(instance, column)) != blank_to_none(value):
+            setattr(instance, column, value)
+            changed.append(column)
+    return changed
+
+
+class Tombstone(db.Model):
+    # records deleted venues, artists and shows for the /api/changes feed
+    __tablename__ = "tombstones"
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(20), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, index=True,
+                           server_default=db.func.now())
+
+    def __repr__(self):
+        return f"<Tombstone {self.entity} {self.entity_id}>"
+
+
+def record_tombstone(entity):
+    # collected per flush and written with one executemany in after_flush,
+    # so deleting a venue with many shows costs the same few statements.
+    def after_delete(mapper, connection, target):
+        session = object_session(target)
+        session.info.setdefault("tombstones", []).append({"entity": entity, "entity_id": target.id})
+    return after_delete
+
+
+@event.listens_for(Session, "after_flush")
+def write_tombstones(session, flush_context):
+    tombstones = session.info.pop("tombstones", None)
+    if tombstones:
+        session.connection().execute(Tombstone.__table__.insert(), tombstones)
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_tombstones(session):
+    session.info.pop("tombstones", None)
+
+
+event.listen(Venue, "after_delete", record_tombstone("venue"))
+event.listen(Artist, "after_delete", record_tombstone("artist"))
+event.listen(Show, "after_delete", record_tombstone("show"))
+
+
+# Rollups behind /analytics, maintained by analytics.py as shows are created
+# and deleted.
+
+class VenueMonthlyShows(db.Model):
+    __tablename__ = "venue_monthly_shows"
+    venue_id = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Date, primary_key=True, index=True)
+    show_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class CityGenreShows(db.Model):
+    __tablename__ = "city_genre_shows"
+    city = db.Column(db.String(120), primary_key=True)
+    state = db.Column(db.String(120), primary_key=True)
+    genre = db.Column(db.String(120), primary_key=True)
+    show_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ArtistMonthlyBookings(db.Model):
+    __tablename__ = "artist_monthly_bookings"
+    artist_id = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Date, primary_key=True, index=True)
+    show_count = db.Column(db.Integer, nullable=False, default=0)
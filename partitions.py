@@ -0,0 +1,140 @@
+from datetime import datetime
+from sqlalchemy import text
+from models import db, Show
+
+# Monthly range partitions of the shows table. Every partition is named
+# shows_YYYY_MM and covers [first day of month, first day of next month).
+# Upcoming-show queries filter on start_time > now(), so the planner prunes
+# them down to the current and future partitions.
+
+PARTITION_PREFIX = "shows_"
+ARCHIVE_SCHEMA = "archive"
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(value, months):
+    month = value.month - 1 + months
+    return datetime(value.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(value):
+    return f"{PARTITION_PREFIX}{value.year:04d}_{value.month:02d}"
+
+
+def partition_month(name):
+    return datetime.strptime(name[len(PARTITION_PREFIX):], "%Y_%m")
+
+
+def list_partitions():
+    rows = db.session.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON pg_inherits.inhrelid = child.oid "
+        "WHERE pg_inherits.inhparent = CAST(:parent AS regclass) "
+        "ORDER BY child.relname"
+    ), {"parent": Show.__tablename__}).all()
+    return [row.relname for row in rows]
+
+
+def create_partition(month):
+    start = month_start(month)
+    end = add_months(start, 1)
+    name = partition_name(start)
+    default = f"{PARTITION_PREFIX}default"
+    bounds = f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    in_range = "start_time >= :start AND start_time < :end"
+    has_default = db.session.execute(
+        text("SELECT to_regclass(:name) IS NOT NULL"), {"name": default}).scalar()
+    stranded = has_default and db.session.execute(
+        text(f"SELECT EXISTS (SELECT 1 FROM {default} WHERE {in_range})"),
+        {"start": start, "end": end}).scalar()
+    if not stranded:
+        db.session.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {Show.__tablename__} {bounds}"
+        ))
+        return name
+    # shows booked past the last partition landed in the default one, and
+    # Postgres refuses a new partition whose range the default already holds
+    # rows for: the default is detached while its rows for the month move.
+    db.session.execute(text(f"ALTER TABLE {Show.__tablename__} DETACH PARTITION {default}"))
+    db.session.execute(text(f"CREATE TABLE {name} PARTITION OF {Show.__tablename__} {bounds}"))
+    params = {"start": start, "end": end}
+    db.session.execute(text(f"INSERT INTO {name} SELECT * FROM {default} WHERE {in_range}"), params)
+    db.session.execute(text(f"DELETE FROM {default} WHERE {in_range}"), params)
+    db.session.execute(text(f"ALTER TABLE {Show.__tablename__} ATTACH PARTITION {default} DEFAULT"))
+    return name
+
+
+def create_default_partition():
+    db.session.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {PARTITION_PREFIX}default "
+        f"PARTITION OF {Show.__tablename__} DEFAULT"
+    ))
+
+
+def ensure_partitions(months_ahead=12, since=None):
+    # creates every missing monthly partition from `since` (default: the
+    # current month) up to `months_ahead` months from now.
+    current = month_start(since or datetime.now())
+    last = add_months(month_start(datetime.now()), months_ahead)
+    existing = set(list_partitions())
+    created = []
+    while current <= last:
+        if partition_name(current) not in existing:
+            created.append(create_partition(current))
+        current = add_months(current, 1)
+    return created
+
+
+def archive_partitions(older_than_months, tablespace=None):
+    # past shows are read far less often than upcoming ones. Old partitions are
+    # either moved to a cheaper tablespace (still attached and queryable) or,
+    # without a tablespace, detached into the archive schema.
+    cutoff = add_months(month_start(datetime.now()), -older_than_months)
+    archived = []
+    for name in list_partitions():
+        if name == f"{PARTITION_PREFIX}default" or partition_month(name) >= cutoff:
+            continue
+        if tablespace:
+            db.session.execute(text(f"ALTER TABLE {name} SET TABLESPACE {tablespace}"))
+        else:
+            db.session.execute(text(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}"))
+            db.session.execute(text(f"ALTER TABLE {Show.__tablename__} DETACH PARTITION {name}"))
+            # detached partitions keep nextval('shows_id_seq') as id default,
+            # which would tie them to the parent's sequence.
+            db.session.execute(text(f"ALTER TABLE {name} ALTER COLUMN id DROP DEFAULT"))
+            db.session.execute(text(f"ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}"))
+        archived.append(name)
+    return archived
+
+
+def convert_to_partitioned(months_ahead=12):
+    # one-off migration of an existing heap shows table: the rows are copied
+    # into a freshly created partitioned table and the old heap is dropped.
+    table = Show.__tablename__
+    db.session.execute(text(f"ALTER TABLE {table} RENAME TO {table}_heap"))
+    db.session.execute(text(f"ALTER SEQUENCE {table}_id_seq RENAME TO {table}_heap_id_seq"))
+    db.session.execute(text(f"ALTER INDEX IF EXISTS {table}_pkey RENAME TO {table}_heap_pkey"))
+    Show.__table__.create(bind=db.session.connection())
+
+    oldest = db.session.execute(text(f"SELECT min(start_time) FROM {table}_heap")).scalar()
+    create_default_partition()
+    ensure_partitions(months_ahead, since=oldest)
+
+    # the heap may predate columns added since (created_at, updated_at);
+    # those are left to their server defaults.
+    heap_columns = {row.column_name for row in db.session.execute(text(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = :table"
+    ), {"table": f"{table}_heap"})}
+    columns = ", ".join(column.name for column in Show.__table__.columns if column.name in heap_columns)
+    db.session.execute(text(
+        f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {table}_heap"
+    ))
+    db.session.execute(text(
+        f"SELECT setval('{table}_id_seq', coalesce((SELECT max(id) FROM {table}), 1))"
+    ))
+    db.session.execute(text(f"DROP TABLE {table}_heap"))
+    db.session.commit()
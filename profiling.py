@@ -0,0 +1,129 @@
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from flask import g, request
+
+# Opt-in sampling profiler. One in PROFILE_SAMPLE_RATE requests (or any
+# request carrying the admin header) gets a sampler thread that records the
+# handling thread's stack every PROFILE_INTERVAL seconds. The samples are
+# written in collapsed-stack format, one directory per endpoint, ready for
+# flamegraph.pl or speedscope.
+
+
+class StackSampler:
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                name = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                stack.append(name.replace(';', ':'))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def profile_filename(duration, request_id):
+    # the duration leads the name so listings can sort without opening files
+    request_id = ''.join(c for c in request_id if c.isalnum())[:32]
+    return f"{int(duration * 1000):08d}ms-{int(time.time())}-{request_id}.collapsed"
+
+
+def parse_filename(name):
+    duration, created, request_id = name[:-len('.collapsed')].split('-', 2)
+    return {'duration_ms': int(duration[:-2]), 'created': int(created), 'request_id': request_id}
+
+
+def enforce_size_cap(directory, max_bytes):
+    files = []
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            files.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        os.remove(path)
+        total -= size
+
+
+def slowest_profiles(directory, per_endpoint=10):
+    profiles = {}
+    if not os.path.isdir(directory):
+        return profiles
+    for endpoint in sorted(os.listdir(directory)):
+        names = sorted(os.listdir(os.path.join(directory, endpoint)), reverse=True)
+        profiles[endpoint] = [
+            dict(parse_filename(name), endpoint=endpoint, filename=name)
+            for name in names[:per_endpoint]
+        ]
+    return profiles
+
+
+def is_admin(app):
+    # header only: a token in the URL would end up in history and proxy logs
+    token = app.config['PROFILE_ADMIN_TOKEN']
+    given = request.headers.get(app.config['PROFILE_ADMIN_HEADER'], '')
+    return bool(token) and hmac.compare_digest(given.encode(), token.encode())
+
+
+def init_profiling(app):
+    if not app.config['PROFILE_ENABLED']:
+        return
+
+    @app.before_request
+    def start_profile():
+        if not (is_admin(app) or random.randrange(app.config['PROFILE_SAMPLE_RATE']) == 0):
+            return
+        g.profile_start = time.perf_counter()
+        g.profiler = StackSampler(threading.get_ident(), app.config['PROFILE_INTERVAL'])
+        g.profiler.start()
+
+    @app.after_request
+    def write_profile(response):
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return response
+        start = g.profile_start
+        directory = os.path.join(app.config['PROFILE_DIR'], request.endpoint or 'unknown')
+        request_id = g.get('request_id') or uuid.uuid4().hex
+
+        def finish():
+            profiler.stop()
+            duration = time.perf_counter() - start
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, profile_filename(duration, request_id)), 'w') as f:
+                f.write(profiler.collapsed())
+            enforce_size_cap(app.config['PROFILE_DIR'], app.config['PROFILE_MAX_BYTES'])
+
+        if response.is_streamed:
+            # keep sampling while the server iterates the body
+            response.call_on_close(finish)
+        else:
+            finish()
+        return response
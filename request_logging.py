@@ -0,0 +1,140 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import time
+import uuid
+from datetime import datetime, timezone
+from logging import Formatter
+from logging.handlers import QueueHandler, QueueListener, WatchedFileHandler
+from flask import g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Request threads format records as JSON and put them on an in-memory queue;
+# one listener thread per process does the disk writes. Every worker process
+# appends to the same files, so rotation is left to an external tool
+# (logrotate, without copytruncate): the handlers reopen a file once it has
+# been moved away.
+
+ACCESS_LOGGER = 'fyyur.access'
+
+
+class JsonFormatter(Formatter):
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            entry['request_id'] = request_id
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        if getattr(record, 'request_id', None) is None and has_request_context() and 'request_id' in g:
+            record.request_id = g.request_id
+        return True
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    if has_app_context() and 'db_time' in g:
+        g.db_time += elapsed
+        g.db_queries += 1
+
+
+def file_handler(path):
+    handler = WatchedFileHandler(path)
+    handler.setFormatter(Formatter('%(message)s'))
+    return handler
+
+
+def init_logging(app):
+    error_handler = file_handler(app.config['ERROR_LOG_FILE'])
+    error_handler.addFilter(lambda record: record.name != ACCESS_LOGGER)
+    access_handler = file_handler(app.config['ACCESS_LOG_FILE'])
+    access_handler.addFilter(lambda record: record.name == ACCESS_LOGGER)
+
+    # QueueHandler.prepare() formats in the calling thread, so the request id,
+    # extra fields and traceback are captured before the record is queued.
+    queue_handler = QueueHandler(queue.Queue(-1))
+    queue_handler.setFormatter(JsonFormatter())
+    queue_handler.addFilter(RequestIdFilter())
+
+    app.logger.setLevel(logging.INFO)
+    app.logger.addHandler(queue_handler)
+    access_logger = logging.getLogger(ACCESS_LOGGER)
+    access_logger.setLevel(logging.INFO)
+    access_logger.propagate = False
+    access_logger.addHandler(queue_handler)
+
+    @app.before_request
+    def start_request_timer():
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        g.request_start = time.perf_counter()
+        g.db_time = 0.0
+        g.db_queries = 0
+
+    @app.after_request
+    def log_request(response):
+        if 'request_start' not in g:
+            return response
+        response.headers['X-Request-ID'] = g.request_id
+        fields = {
+            'method': request.method,
+            'route': request.url_rule.rule if request.url_rule else None,
+            'endpoint': request.endpoint,
+            'path': request.path,
+            'status': response.status_code,
+        }
+        # the same g keeps counting queries while a streamed body renders
+        request_g = g._get_current_object()
+        request_id = g.request_id
+
+        def write_record():
+            fields.update({
+                'latency_ms': round((time.perf_counter() - request_g.request_start) * 1000, 3),
+                'db_ms': round(request_g.db_time * 1000, 3),
+                'db_queries': request_g.db_queries,
+            })
+            access_logger.info('request', extra={'fields': fields, 'request_id': request_id})
+
+        if response.is_streamed:
+            # a streamed body is rendered after this hook returns; log once
+            # the server has sent it and closed the response
+            response.call_on_close(write_record)
+        else:
+            write_record()
+        return response
+
+    def start_listener():
+        # A forked worker (gunicorn --preload) inherits the queue but not the
+        # listener thread, so every process starts its own on a fresh queue.
+        inherited = app.extensions.get('log_listener')
+        if inherited is not None:
+            atexit.unregister(inherited.stop)
+        queue_handler.queue = queue.Queue(-1)
+        listener = QueueListener(queue_handler.queue, error_handler, access_handler)
+        listener.start()
+        # flushes whatever is still queued when the process exits
+        atexit.register(listener.stop)
+        app.extensions['log_listener'] = listener
+
+    start_listener()
+    os.register_at_fork(after_in_child=start_listener)
+    return app.extensions['log_listener']
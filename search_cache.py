@@ -0,0 +1,139 @@
+import threading
+import time
+from collections import Counter, OrderedDict
+
+# Protection for the search endpoints: identical concurrent searches share one
+# computation (single flight), finished results are kept for a few seconds
+# and every client draws from its own token bucket.
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self._counts[name] += amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+
+class TTLCache:
+    def __init__(self, ttl, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        # returns (result, shared); shared is True when another request
+        # was already computing the same key and we only waited for it.
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+
+class TokenBucketLimiter:
+    # in-memory backend: buckets live in this worker process only
+    def __init__(self, rate, capacity, max_clients=10000):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def acquire(self, client):
+        # returns 0 when a token was taken, otherwise the seconds until one
+        # becomes available.
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(client, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+            retry_after = 0 if tokens >= 1 else (1 - tokens) / self.rate
+            self._buckets[client] = (tokens - 1 if tokens >= 1 else tokens, now)
+            # evict the least recently seen client: it has had the longest to
+            # refill, and at worst comes back with a full bucket
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+            return retry_after
+
+
+class SearchCache:
+    def __init__(self, ttl, rate, burst, max_entries=1024):
+        self.metrics = Metrics()
+        self.results = TTLCache(ttl, max_entries)
+        self.flights = SingleFlight()
+        self.limiter = TokenBucketLimiter(rate, burst)
+
+    def throttle(self, client):
+        retry_after = self.limiter.acquire(client)
+        if retry_after:
+            self.metrics.incr('throttled')
+        return retry_after
+
+    def get_or_compute(self, key, fn):
+        self.metrics.incr('requests')
+        result = self.results.get(key)
+        if result is not None:
+            self.metrics.incr('cache_hits')
+            return result
+
+        def compute():
+            value = fn()
+            self.results.set(key, value)
+            return value
+
+        result, shared = self.flights.do(key, compute)
+        self.metrics.incr('coalesced' if shared else 'computed')
+        return result
@@ -0,0 +1,186 @@
+import json
+import logging
+import queue
+import select
+import threading
+import time
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session, object_session
+from models import Show
+
+# Show change notifications for /stream/shows. Writes to shows emit an event
+# that is delivered only once the transaction commits: through Postgres
+# NOTIFY (every worker hears every write) or, with the local backend used in
+# tests and single-process setups, straight from the committing session.
+# Each worker runs one listener and fans events out to its subscribers.
+
+CHANNEL = 'shows_changed'
+logger = logging.getLogger(__name__)
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class Broker:
+    def __init__(self, max_pending=100, max_subscribers=20):
+        self.max_pending = max_pending
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._subscribers = set()
+
+    def subscribe(self):
+        subscriber = queue.Queue(self.max_pending)
+        with self._lock:
+            # every subscriber holds a worker thread for its whole connection
+            if len(self._subscribers) >= self.max_subscribers:
+                raise TooManySubscribers(self.max_subscribers)
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, change):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(change)
+            except queue.Full:
+                # a client that stopped reading must not hold up the others;
+                # make room for the close marker without ever blocking here
+                self.unsubscribe(subscriber)
+                try:
+                    subscriber.get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    subscriber.put_nowait(None)
+                except queue.Full:
+                    pass
+
+
+class LocalBackend:
+    def __init__(self, broker):
+        self.broker = broker
+
+    def flushed(self, session):
+        pass
+
+    def committed(self, session):
+        for change in session.info.pop('show_events', []):
+            self.broker.publish(change)
+
+    def start(self, engine):
+        pass
+
+
+class PostgresBackend:
+    def __init__(self, broker):
+        self.broker = broker
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def flushed(self, session):
+        # one statement per flush; Postgres delivers the notifications only
+        # if the transaction commits.
+        changes = session.info.pop('show_events', None)
+        if changes:
+            session.connection().execute(
+                text('SELECT pg_notify(:channel, payload) FROM unnest(CAST(:payloads AS text[])) AS payload'),
+                {'channel': CHANNEL, 'payloads': [json.dumps(change) for change in changes]})
+
+    def committed(self, session):
+        pass
+
+    def start(self, engine):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._listen, args=(engine,), daemon=True)
+                self._thread.start()
+
+    def _listen(self, engine):
+        while True:
+            raw = None
+            try:
+                raw = engine.raw_connection()
+                connection = raw.dbapi_connection
+                connection.autocommit = True
+                connection.cursor().execute(f'LISTEN {CHANNEL}')
+                while True:
+                    if select.select([connection], [], [], 5) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        self.broker.publish(json.loads(connection.notifies.pop(0).payload))
+            except Exception:
+                logger.exception('show change listener lost its connection')
+                time.sleep(1)
+            finally:
+                if raw is not None:
+                    raw.invalidate()
+
+
+broker = Broker()
+backend = None
+
+
+def init_show_events(app):
+    global backend
+    broker.max_pending = app.config['SHOW_EVENTS_MAX_PENDING']
+    broker.max_subscribers = app.config['SHOW_EVENTS_MAX_SUBSCRIBERS']
+    if app.config['SHOW_EVENTS_BACKEND'] == 'postgres':
+        backend = PostgresBackend(broker)
+    else:
+        backend = LocalBackend(broker)
+
+
+def subscribe(engine):
+    backend.start(engine)
+    return broker.subscribe()
+
+
+def unsubscribe(subscriber):
+    broker.unsubscribe(subscriber)
+
+
+def show_change(op, show):
+    return {
+        'op': op,
+        'id': show.id,
+        # the create form hands the ids over as strings
+        'venue_id': int(show.venue_id),
+        'artist_id': int(show.artist_id),
+        'start_time': show.start_time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+
+def emitter(op):
+    def emit(mapper, connection, target):
+        if backend is not None:
+            object_session(target).info.setdefault('show_events', []).append(show_change(op, target))
+    return emit
+
+
+event.listen(Show, 'after_insert', emitter('created'))
+event.listen(Show, 'after_update', emitter('changed'))
+event.listen(Show, 'after_delete', emitter('cancelled'))
+
+
+@event.listens_for(Session, 'after_flush')
+def send_flushed(session, flush_context):
+    if backend is not None:
+        backend.flushed(session)
+
+
+@event.listens_for(Session, 'after_commit')
+def publish_committed(session):
+    if backend is not None:
+        backend.committed(session)
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_rolled_back(session):
+    session.info.pop('show_events', None)
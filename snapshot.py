@@ -0,0 +1,171 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from urllib.parse import quote
+from models import db, Venue
+
+# Read-only catalogue snapshots. `flask snapshot build` writes the venue,
+# artist and show pages, as the live views compute them, into one SQLite
+# file next to SNAPSHOT_PATH and renames it into place. Read-only workers
+# open it memory-mapped and immutable; a worker notices a newly published
+# file by its inode and switches to it, while requests already reading the
+# old file finish against it.
+
+FORMAT_VERSION = 1
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE pages (name TEXT PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE venues (id INTEGER PRIMARY KEY, name TEXT NOT NULL,
+                     num_upcoming_shows INTEGER NOT NULL, detail TEXT NOT NULL);
+CREATE TABLE artists (id INTEGER PRIMARY KEY, name TEXT NOT NULL,
+                      num_upcoming_shows INTEGER NOT NULL, detail TEXT NOT NULL);
+CREATE TABLE shows (position INTEGER PRIMARY KEY, venue_id INTEGER NOT NULL, venue_name TEXT,
+                    artist_id INTEGER NOT NULL, artist_name TEXT, artist_image_link TEXT,
+                    start_time TEXT NOT NULL);
+"""
+SHOW_COLUMNS = ('venue_id', 'venue_name', 'artist_id', 'artist_name', 'artist_image_link', 'start_time')
+
+
+def build(path, venue_areas, venue_detail, artist_detail, listed_artists, listed_shows):
+    # the page builders are the ones behind the live views, so a snapshot page
+    # holds exactly what the view would have rendered at build time.
+    partial = f"{path}.{os.getpid()}.partial"
+    if os.path.exists(partial):
+        os.remove(partial)
+    connection = sqlite3.connect(partial)
+    counts = {}
+    started = False
+    try:
+        # one REPEATABLE READ transaction for every query below, so the
+        # venues page, the detail pages and the shows all describe the
+        # database at the same moment. A caller already inside a transaction
+        # (the tests) keeps its own.
+        started = not db.session().in_transaction()
+        if started:
+            db.session.connection(execution_options={'isolation_level': 'REPEATABLE READ'})
+        connection.executescript(SCHEMA)
+        connection.execute("INSERT INTO pages VALUES ('venues', ?)", (json.dumps(venue_areas()),))
+
+        venue_ids = [row.id for row in db.session.query(Venue.id).order_by(Venue.id)]
+        for venue_id in venue_ids:
+            detail = venue_detail(venue_id)
+            connection.execute("INSERT INTO venues VALUES (?, ?, ?, ?)", (
+                venue_id, detail['name'], len(detail['upcoming_shows']), json.dumps(detail)))
+        counts['venues'] = len(venue_ids)
+
+        artist_ids = [artist['id'] for artist in listed_artists()]
+        for artist_id in artist_ids:
+            detail = artist_detail(artist_id)
+            connection.execute("INSERT INTO artists VALUES (?, ?, ?, ?)", (
+                artist_id, detail['name'], len(detail['upcoming_shows']), json.dumps(detail)))
+        counts['artists'] = len(artist_ids)
+
+        counts['shows'] = 0
+        for show in listed_shows():
+            counts['shows'] += 1
+            connection.execute("INSERT INTO shows VALUES (?, ?, ?, ?, ?, ?, ?)",
+                               (counts['shows'],) + tuple(show[column] for column in SHOW_COLUMNS))
+
+        connection.executemany("INSERT INTO meta VALUES (?, ?)", [
+            ('format', str(FORMAT_VERSION)),
+            ('built_at', datetime.now().isoformat(timespec='seconds')),
+        ])
+        connection.commit()
+    except BaseException:
+        connection.close()
+        os.remove(partial)
+        if started:
+            db.session.rollback()
+        raise
+    if started:
+        db.session.commit()
+    connection.close()
+    # rename is atomic: readers see either the previous snapshot or this one
+    os.replace(partial, path)
+    return counts
+
+
+class Snapshot:
+    def __init__(self, path):
+        self.connection = sqlite3.connect(f"file:{quote(os.path.abspath(path))}?mode=ro&immutable=1",
+                                          uri=True, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute(f"PRAGMA mmap_size = {os.path.getsize(path)}")
+        self.meta = dict(self.connection.execute("SELECT key, value FROM meta").fetchall())
+        if self.meta.get('format') != str(FORMAT_VERSION):
+            self.connection.close()
+            raise ValueError(f"{path} is snapshot format {self.meta.get('format')}, expected {FORMAT_VERSION}")
+
+    def close(self):
+        self.connection.close()
+
+    def page(self, name):
+        row = self.connection.execute("SELECT data FROM pages WHERE name = ?", (name,)).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def _detail(self, table, entity_id):
+        row = self.connection.execute(f"SELECT detail FROM {table} WHERE id = ?", (entity_id,)).fetchone()
+        return json.loads(row['detail']) if row else None
+
+    def venue(self, venue_id):
+        return self._detail('venues', venue_id)
+
+    def artist(self, artist_id):
+        return self._detail('artists', artist_id)
+
+    def _search(self, table, search_term):
+        rows = self.connection.execute(
+            f"SELECT id, name, num_upcoming_shows FROM {table} "
+            f"WHERE name LIKE ? ESCAPE '\\' ORDER BY id",
+            ('%' + search_term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%',)
+        ).fetchall()
+        items = [dict(row) for row in rows]
+        return {'count': len(items), 'data': items}
+
+    def search_venues(self, search_term):
+        return self._search('venues', search_term)
+
+    def search_artists(self, search_term):
+        return self._search('artists', search_term)
+
+    def artists(self):
+        return (dict(row) for row in self.connection.execute("SELECT id, name FROM artists ORDER BY id"))
+
+    def shows(self):
+        return (dict(row) for row in self.connection.execute(
+            f"SELECT {', '.join(SHOW_COLUMNS)} FROM shows ORDER BY position"))
+
+
+class SnapshotReader:
+    def __init__(self, path, check_interval=5):
+        self.path = path
+        self.check_interval = check_interval
+        self._version = None
+        self._checked = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _published_version(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._version is None or now - self._checked >= self.check_interval:
+                stat = os.stat(self.path)
+                self._version = (stat.st_ino, stat.st_mtime_ns)
+                self._checked = now
+            return self._version
+
+    def current(self):
+        # one connection per thread; a thread reopens once a newer file has
+        # been published and closes its connection to the old one.
+        version = self._published_version()
+        local = self._local
+        if getattr(local, 'version', None) != version:
+            if getattr(local, 'snapshot', None) is not None:
+                local.snapshot.close()
+            local.snapshot = None
+            local.snapshot = Snapshot(self.path)
+            local.version = version
+        return local.snapshot
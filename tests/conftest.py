@@ -0,0 +1,218 @@
+import os
+import re
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event, text
+
+# The schema relies on Postgres features (partitioned shows, ON CONFLICT
+# rollups), so the suite runs against a local Postgres database. Every xdist
+# worker builds the schema from models.py once, in its own Postgres schema,
+# and every test runs inside a transaction that is rolled back afterwards.
+TEST_DATABASE_URL = os.environ.get(
+    'TEST_DATABASE_URL', 'postgresql://localhost:5432/fyyur_test')
+os.environ['DATABASE_URL'] = TEST_DATABASE_URL
+os.environ['SHOW_EVENTS_BACKEND'] = 'local'
+
+import app as app_module  # noqa: E402
+from app import app as fyyur_app  # noqa: E402
+from matchmaking import Matchmaker  # noqa: E402
+from models import db, Venue, Artist, Show  # noqa: E402
+from search_cache import SearchCache  # noqa: E402
+import partitions  # noqa: E402
+
+TRANSACTION_CONTROL = re.compile(r'^\s*(SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT)', re.I)
+
+
+@pytest.fixture(scope='session')
+def app(worker_id):
+    schema = f'test_{worker_id}'
+    admin = create_engine(TEST_DATABASE_URL)
+    with admin.begin() as connection:
+        connection.execute(text(f'DROP SCHEMA IF EXISTS {schema} CASCADE'))
+        connection.execute(text(f'CREATE SCHEMA {schema}'))
+
+    fyyur_app.config.update(
+        TESTING=True,
+        WTF_CSRF_ENABLED=False,
+        # the change feed only waits for open transactions of its own
+        # application_name; workers must not wait for each other's
+        SQLALCHEMY_ENGINE_OPTIONS={'connect_args': {
+            'options': f'-csearch_path={schema}', 'application_name': f'fyyur_{schema}'}},
+    )
+    with fyyur_app.app_context():
+        db.create_all()
+        partitions.create_default_partition()
+        partitions.ensure_partitions(months_ahead=3, since=datetime.now() - timedelta(days=90))
+        db.session.commit()
+        db.session.remove()
+
+    yield fyyur_app
+
+    with fyyur_app.app_context():
+        db.get_engine().dispose()
+    with admin.begin() as connection:
+        connection.execute(text(f'DROP SCHEMA IF EXISTS {schema} CASCADE'))
+    admin.dispose()
+
+
+@pytest.fixture
+def connection(app):
+    with app.app_context():
+        connection = db.get_engine().connect()
+        transaction = connection.begin()
+        try:
+            yield connection
+        finally:
+            transaction.rollback()
+            connection.close()
+
+
+@pytest.fixture
+def session(connection):
+    scoped = db.create_scoped_session(options={'bind': connection, 'binds': {}})
+
+    # commits and rollbacks in the views only end a SAVEPOINT; the outer
+    # transaction is rolled back when the test finishes.
+    @event.listens_for(scoped, 'after_begin')
+    def start_savepoint(sess, trans, conn):
+        if not trans.nested and trans._parent is None:
+            sess.begin_nested()
+
+    @event.listens_for(scoped, 'after_transaction_end')
+    def restart_savepoint(sess, trans):
+        if trans.nested and not trans._parent.nested:
+            sess.expire_all()
+            sess.begin_nested()
+
+    original = db.session
+    db.session = scoped
+    try:
+        yield scoped
+    finally:
+        db.session = original
+        scoped.remove()
+
+
+@pytest.fixture
+def client(app, session, monkeypatch):
+    # per-worker caches must not carry rows from rolled-back tests
+    monkeypatch.setattr(app_module, 'search_cache', SearchCache(
+        ttl=app.config['SEARCH_CACHE_TTL'], rate=1000, burst=1000))
+    monkeypatch.setattr(app_module, 'matchmaker', Matchmaker(
+        refresh_interval=app.config['MATCH_REFRESH_SECONDS'], lag=app.config['CHANGES_LAG_SECONDS']))
+    return app.test_client()
+
+
+@pytest.fixture
+def count_queries(connection):
+    @contextmanager
+    def record_statements():
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if not TRANSACTION_CONTROL.match(statement):
+                statements.append(statement)
+
+        event.listen(connection, 'before_cursor_execute', record)
+        try:
+            yield statements
+        finally:
+            event.remove(connection, 'before_cursor_execute', record)
+
+    return record_statements
+
+
+@pytest.fixture
+def assert_max_queries(count_queries):
+    @contextmanager
+    def check(budget):
+        with count_queries() as statements:
+            yield statements
+        assert len(statements) <= budget, (
+            f'{len(statements)} queries, budget is {budget}:\n' + '\n'.join(statements))
+
+    return check
+
+
+@pytest.fixture
+def catalogue(session):
+    now = datetime.now()
+    venues = [
+        Venue(name='The Musical Hop', city='San Francisco', state='CA', address='1015 Folsom Street',
+              phone='123-123-1234', website='https://www.themusicalhop.com', genres='Jazz,Reggae,Swing',
+              seeking_talent=True, seeking_description='We are looking for local artists.'),
+        Venue(name='Park Square Live Music & Coffee', city='San Francisco', state='CA',
+              address='34 Whiskey Moore Ave', phone='415-000-1234', website='https://www.parksquarelivemusicandcoffee.com',
+              genres='Rock n Roll,Jazz,Classical,Folk', seeking_talent=False),
+        Venue(name='The Dueling Pianos Bar', city='New York', state='NY', address='335 Delancey Street',
+              phone='914-003-1132', website='https://www.theduelingpianos.com', genres='Classical,R&B,Hip-Hop',
+              seeking_talent=True),
+    ]
+    artists = [
+        Artist(name='Guns N Petals', city='San Francisco', state='CA', phone='326-123-5000',
+               genres='Rock n Roll', seeking_venue=True, website='https://www.gunsnpetalsband.com'),
+        Artist(name='Matt Quevedo', city='New York', state='NY', phone='300-400-5000',
+               genres='Jazz', seeking_venue=False),
+        Artist(name='The Wild Sax Band', city='San Francisco', state='CA', phone='432-325-5432',
+               genres='Jazz,Classical', seeking_venue=True),
+    ]
+    session.add_all(venues + artists)
+    session.flush()
+    shows = [
+        Show(venue_id=venues[0].id, artist_id=artists[0].id, date=now, start_time=now - timedelta(days=30)),
+        Show(venue_id=venues[0].id, artist_id=artists[2].id, date=now, start_time=now + timedelta(days=7)),
+        Show(venue_id=venues[1].id, artist_id=artists[1].id, date=now, start_time=now + timedelta(days=14)),
+        Show(venue_id=venues[2].id, artist_id=artists[2].id, date=now, start_time=now - timedelta(days=60)),
+        Show(venue_id=venues[2].id, artist_id=artists[0].id, date=now, start_time=now + timedelta(days=21)),
+    ]
+    session.add_all(shows)
+    session.commit()
+    return {'venue_id': venues[0].id, 'artist_id': artists[0].id}
+
+
+@pytest.fixture
+def grow_catalogue(app, session, catalogue, monkeypatch):
+    # Adds venues in new cities, artists and shows on top of the catalogue and
+    # returns a venue and an artist with more shows than any catalogue row, so
+    # a query count that grows with the data shows up as a difference.
+    def grow():
+        now = datetime.now()
+        venues = [
+            Venue(name=f'Grown Venue {i}', city=f'Grown City {i % 3}', state='TX', address=f'{i} Main Street',
+                  phone='512-555-0100', website=f'https://venue{i}.example.com', genres='Jazz,Blues',
+                  seeking_talent=True)
+            for i in range(6)
+        ]
+        artists = [
+            Artist(name=f'Grown Artist {i}', city=f'Grown City {i % 3}', state='TX', phone='512-555-0101',
+                   genres='Jazz,Blues', seeking_venue=True, website=f'https://artist{i}.example.com')
+            for i in range(6)
+        ]
+        session.add_all(venues + artists)
+        session.flush()
+        shows = [
+            Show(venue_id=venue.id, artist_id=artist.id, date=now,
+                 start_time=now + timedelta(days=(-1) ** i * (i + 1) * 7))
+            for i, (venue, artist) in enumerate(zip(venues, artists))
+        ]
+        shows += [
+            Show(venue_id=venues[0].id, artist_id=artist.id, date=now,
+                 start_time=now + timedelta(days=(-1) ** i * (i + 2) * 5))
+            for i, artist in enumerate(artists[1:])
+        ]
+        shows += [
+            Show(venue_id=venue.id, artist_id=artists[0].id, date=now,
+                 start_time=now + timedelta(days=(-1) ** i * (i + 3) * 4))
+            for i, venue in enumerate(venues[1:])
+        ]
+        session.add_all(shows)
+        session.commit()
+        monkeypatch.setattr(app_module, 'search_cache', SearchCache(
+            ttl=app.config['SEARCH_CACHE_TTL'], rate=1000, burst=1000))
+        monkeypatch.setattr(app_module, 'matchmaker', Matchmaker(
+            refresh_interval=app.config['MATCH_REFRESH_SECONDS'], lag=app.config['CHANGES_LAG_SECONDS']))
+        return {'venue_id': venues[0].id, 'artist_id': artists[0].id}
+
+    return grow
@@ -0,0 +1,36 @@
+from datetime import datetime, timedelta
+
+import analytics
+from models import Artist, Show, Venue, CityGenreShows, ArtistMonthlyBookings
+
+
+def city_genres(session):
+    return {(row.city, row.state, row.genre): row.show_count
+            for row in session.query(CityGenreShows).filter(CityGenreShows.show_count != 0)}
+
+
+def test_edits_move_city_genre_counts(session, catalogue):
+    artist = session.get(Artist, catalogue['artist_id'])
+    artist.genres = 'Punk,Rock n Roll'
+    venue = session.get(Venue, catalogue['venue_id'])
+    venue.city, venue.state = 'Oakland', 'CA'
+    session.commit()
+    for show in session.query(Show).filter(Show.artist_id == catalogue['artist_id']):
+        session.delete(show)
+    session.commit()
+
+    incremental = city_genres(session)
+    assert all(count > 0 for count in incremental.values())
+    analytics.rebuild()
+    assert incremental == city_genres(session)
+
+
+def test_booking_frequency_stops_at_the_selected_month(session, catalogue):
+    now = datetime.now()
+    session.add(Show(venue_id=catalogue['venue_id'], artist_id=catalogue['artist_id'],
+                     date=now, start_time=now - timedelta(days=400)))
+    session.commit()
+    month = now - timedelta(days=400)
+    bookings = analytics.artist_booking_frequency(month - timedelta(days=330), month)
+    assert [row['num_shows'] for row in bookings] == [1]
+    assert session.query(ArtistMonthlyBookings).count() > 1
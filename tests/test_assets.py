@@ -0,0 +1,110 @@
+import gzip
+import json
+import os
+
+import pytest
+from flask import Flask, url_for
+
+import assets
+
+
+@pytest.fixture
+def static_folder(tmp_path):
+    folder = tmp_path / 'static'
+    (folder / 'css').mkdir(parents=True)
+    (folder / 'img').mkdir()
+    (folder / 'css' / 'main.css').write_text('body { color: #333; }\n' * 100)
+    (folder / 'img' / 'logo.png').write_bytes(b'\x89PNG not really')
+    return folder
+
+
+def assets_app(static_folder):
+    app = Flask(__name__, static_folder=str(static_folder))
+    app.config.update(STATIC_MAX_AGE=3600, COMPRESS_MIN_SIZE=1024, COMPRESS_LEVEL=6)
+    assets.init_assets(app)
+
+    @app.route('/page/<int:size>')
+    def page(size):
+        response = app.response_class('x' * size, mimetype='text/html')
+        response.set_etag('v1')
+        return response
+
+    return app
+
+
+def test_build_writes_hashed_copies_and_manifest(static_folder):
+    manifest = assets.build(str(static_folder))
+    css = manifest['css/main.css']
+    assert css.startswith('css/main.') and css.endswith('.css') and css != 'css/main.css'
+    assert (static_folder / css).read_bytes() == (static_folder / 'css' / 'main.css').read_bytes()
+    assert gzip.decompress((static_folder / (css + '.gz')).read_bytes()) == (static_folder / css).read_bytes()
+    # only text formats get compressed variants
+    assert not (static_folder / (manifest['img/logo.png'] + '.gz')).exists()
+    assert json.loads((static_folder / 'manifest.json').read_text()) == manifest
+
+
+def test_rebuild_removes_stale_hashed_files(static_folder):
+    old = assets.build(str(static_folder))['css/main.css']
+    (static_folder / 'css' / 'main.css').write_text('body { color: #000; }\n')
+    new = assets.build(str(static_folder))['css/main.css']
+    assert new != old
+    assert not (static_folder / old).exists() and not (static_folder / (old + '.gz')).exists()
+    assert (static_folder / new).exists() and (static_folder / 'css' / 'main.css').exists()
+    # hashed copies are never hashed again
+    assert sorted(os.listdir(static_folder / 'css')) == sorted(['main.css', os.path.basename(new),
+                                                                os.path.basename(new) + '.gz'])
+
+
+def test_url_for_resolves_to_hashed_copy(static_folder):
+    manifest = assets.build(str(static_folder))
+    app = assets_app(static_folder)
+    with app.test_request_context():
+        assert url_for('static', filename='css/main.css') == '/static/' + manifest['css/main.css']
+        assert url_for('static', filename='missing.js') == '/static/missing.js'
+
+
+@pytest.mark.parametrize('accept, encoding', [
+    ('gzip, br', 'br'),
+    ('gzip', 'gzip'),
+    ('gzip;q=0, br;q=0', None),
+    ('', None),
+])
+def test_hashed_file_served_precompressed_and_immutable(static_folder, accept, encoding):
+    css = assets.build(str(static_folder))['css/main.css']
+    # brotli may not be installed; a stand-in .br variant is enough to pick it
+    (static_folder / (css + '.br')).write_bytes(b'brotli bytes')
+    client = assets_app(static_folder).test_client()
+    response = client.get('/static/' + css, headers={'Accept-Encoding': accept})
+    suffix = {'br': '.br', 'gzip': '.gz', None: ''}[encoding]
+    assert response.headers.get('Content-Encoding') == encoding
+    assert response.get_data() == (static_folder / (css + suffix)).read_bytes()
+    assert response.mimetype == 'text/css'
+    assert response.headers['Cache-Control'] == 'public, max-age=3600, immutable'
+    assert 'Accept-Encoding' in response.vary
+    response.close()
+
+
+def test_unhashed_file_is_not_immutable(static_folder):
+    assets.build(str(static_folder))
+    response = assets_app(static_folder).test_client().get('/static/css/main.css')
+    assert 'immutable' not in response.headers.get('Cache-Control', '')
+    response.close()
+
+
+@pytest.mark.parametrize('size, accept, compressed', [
+    (100, 'gzip', False),
+    (5000, 'gzip', True),
+    (5000, 'gzip;q=0', False),
+    (5000, 'identity', False),
+])
+def test_responses_compressed_above_threshold(static_folder, size, accept, compressed):
+    response = assets_app(static_folder).test_client().get(f'/page/{size}', headers={'Accept-Encoding': accept})
+    if compressed:
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(response.get_data()) == b'x' * size
+        # the ETag named the uncompressed bytes
+        assert response.get_etag() == ('v1', True)
+    else:
+        assert 'Content-Encoding' not in response.headers
+        assert response.get_data() == b'x' * size
+        assert response.get_etag() == ('v1', False)
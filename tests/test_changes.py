@@ -0,0 +1,60 @@
+from sqlalchemy import text
+
+import changes
+from models import db
+
+
+def test_lag_holds_back_changes_by_database_time(session, catalogue):
+    # inside the test transaction now() is the time every row was stamped at
+    assert changes.get_changes(lag=2)['changes'] == []
+    assert len(changes.get_changes(lag=0, limit=1000)['changes']) == 11
+
+
+def test_cursor_pages_through_every_change_once(session, catalogue):
+    everything = changes.get_changes(limit=1000)['changes']
+    pages = []
+    feed = changes.get_changes(limit=4)
+    while True:
+        pages.append(feed['changes'])
+        if not feed['has_more']:
+            break
+        feed = changes.get_changes(since=feed['next_cursor'], limit=4)
+    assert [len(page) for page in pages] == [4, 4, 3]
+    assert [change for page in pages for change in page] == everything
+
+    # the last cursor is stable: nothing new, nothing more to fetch
+    feed = changes.get_changes(since=feed['next_cursor'], limit=4)
+    assert feed['changes'] == [] and not feed['has_more']
+
+
+def test_invalid_cursor_is_rejected(client):
+    response = client.get('/api/changes?since=not-a-cursor')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'invalid cursor'}
+
+
+def test_cascaded_venue_delete_writes_tombstones(client, catalogue):
+    client.get(f"/venues/{catalogue['venue_id']}/delete")
+    deletes = [change for change in changes.get_changes(limit=1000)['changes'] if change['op'] == 'delete']
+    assert sorted(change['type'] for change in deletes) == ['show', 'show', 'venue']
+    assert [change['id'] for change in deletes if change['type'] == 'venue'] == [catalogue['venue_id']]
+
+
+def test_changes_wait_for_open_transactions(session, catalogue):
+    other = db.get_engine().connect()
+    transaction = other.begin()
+    try:
+        other.execute(text('SELECT 1'))
+        # a change stamped after the other transaction started; a row that
+        # transaction writes would be stamped earlier and commit later
+        session.execute(text('UPDATE venues SET updated_at = clock_timestamp() WHERE id = :id'),
+                        {'id': catalogue['venue_id']})
+        ids = {change['id'] for change in changes.get_changes(limit=1000)['changes'] if change['type'] == 'venue'}
+        assert catalogue['venue_id'] not in ids
+    finally:
+        transaction.rollback()
+        other.close()
+    # pg_stat_activity is read once per transaction
+    session.execute(text('SELECT pg_stat_clear_snapshot()'))
+    ids = {change['id'] for change in changes.get_changes(limit=1000)['changes'] if change['type'] == 'venue'}
+    assert catalogue['venue_id'] in ids
@@ -0,0 +1,85 @@
+import pytest
+
+from models import Venue, Artist
+
+
+def statements_matching(statements, prefix):
+    return [statement for statement in statements if statement.lstrip().upper().startswith(prefix)]
+
+
+def test_unchanged_save_issues_no_update(client, catalogue, assert_max_queries):
+    venue = Venue.query.get(catalogue['venue_id'])
+    data = {
+        'name': venue.name, 'city': venue.city, 'state': venue.state, 'address': venue.address,
+        'phone': venue.phone, 'genres': venue.genres.split(','), 'image_link': venue.image_link or '',
+        'facebook_link': venue.facebook_link or '', 'website_link': venue.website,
+        'seeking_talent': 'y', 'seeking_description': venue.seeking_description or '',
+        'version_id': venue.version_id,
+    }
+    with assert_max_queries(1) as statements:
+        response = client.post(f"/venues/{catalogue['venue_id']}/edit", data=data)
+    assert response.status_code == 302
+    assert statements_matching(statements, 'UPDATE') == []
+
+
+def test_patch_writes_only_changed_columns(client, catalogue, assert_max_queries):
+    artist = Artist.query.get(catalogue['artist_id'])
+    version = artist.version_id
+    with assert_max_queries(2) as statements:
+        response = client.patch(f"/artists/{catalogue['artist_id']}/edit",
+                                data={'phone': '415-555-0199', 'version_id': version})
+    assert response.status_code == 200
+    assert response.get_json() == {'version_id': version + 1}
+    assert response.headers['ETag'] == f'"{version + 1}"'
+    [update] = statements_matching(statements, 'UPDATE')
+    assert 'phone=' in update and 'name=' not in update and 'genres=' not in update
+
+    artist = Artist.query.get(catalogue['artist_id'])
+    assert artist.phone == '415-555-0199'
+    assert artist.name == 'Guns N Petals'
+    assert artist.version_id == version + 1
+
+
+def test_stale_version_is_rejected(client, catalogue):
+    artist = Artist.query.get(catalogue['artist_id'])
+    stale = artist.version_id
+    client.patch(f"/artists/{catalogue['artist_id']}/edit", data={'city': 'Oakland', 'version_id': stale})
+
+    response = client.patch(f"/artists/{catalogue['artist_id']}/edit", data={'city': 'Berkeley', 'version_id': stale})
+    assert response.status_code == 409
+    assert response.get_json()['error'] == 'conflict'
+    assert Artist.query.get(catalogue['artist_id']).city == 'Oakland'
+
+
+def test_stale_form_post_returns_conflict(client, catalogue):
+    venue = Venue.query.get(catalogue['venue_id'])
+    response = client.post(f"/venues/{catalogue['venue_id']}/edit",
+                           data={'name': 'Renamed', 'version_id': venue.version_id + 1})
+    assert response.status_code == 409
+    assert Venue.query.get(catalogue['venue_id']).name == 'The Musical Hop'
+
+
+@pytest.mark.parametrize('method', ['post', 'patch'])
+def test_edit_of_missing_venue_is_not_found(client, catalogue, method):
+    response = getattr(client, method)('/venues/999999/edit', data={'name': 'Nowhere'})
+    assert response.status_code == 404
+
+
+def test_if_match_star_accepts_any_current_version(client, catalogue):
+    response = client.patch(f"/artists/{catalogue['artist_id']}/edit", data={'city': 'Oakland'},
+                            headers={'If-Match': '*'})
+    assert response.status_code == 200
+    assert Artist.query.get(catalogue['artist_id']).city == 'Oakland'
+
+
+def test_if_match_round_trips_and_fails_with_412(client, catalogue):
+    url = f"/artists/{catalogue['artist_id']}/edit"
+    first = client.patch(url, data={'city': 'Oakland'})
+    etag = first.headers['ETag']
+    second = client.patch(url, data={'city': 'Berkeley'}, headers={'If-Match': etag})
+    assert second.status_code == 200
+
+    response = client.patch(url, data={'city': 'Alameda'}, headers={'If-Match': etag})
+    assert response.status_code == 412
+    assert response.get_json()['error'] == 'precondition failed'
+    assert Artist.query.get(catalogue['artist_id']).city == 'Berkeley'
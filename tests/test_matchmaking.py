@@ -0,0 +1,30 @@
+from sqlalchemy import text
+
+import app as app_module
+from models import Venue
+
+
+def test_matches_require_the_subject_to_be_seeking(client, session, catalogue):
+    page = client.get(f"/venues/{catalogue['venue_id']}/matches").get_data(as_text=True)
+    assert 'The Wild Sax Band' in page
+
+    venue = session.get(Venue, catalogue['venue_id'])
+    venue.seeking_talent = False
+    session.commit()
+    page = client.get(f"/venues/{catalogue['venue_id']}/matches").get_data(as_text=True)
+    assert 'The Wild Sax Band' not in page
+    assert 'not looking for artists' in page
+
+
+def test_refresh_reads_commits_stamped_before_the_last_refresh(client, session, catalogue):
+    index = app_module.matchmaker.artists
+    index.refresh(force=True)
+    assert catalogue['artist_id'] in index.entries
+
+    # a transaction that started a second before the refresh commits after it
+    session.execute(text(
+        "UPDATE artists SET seeking_venue = false, updated_at = now() - interval '1 second' WHERE id = :id"
+    ), {'id': catalogue['artist_id']})
+    session.commit()
+    index.refresh(force=True)
+    assert catalogue['artist_id'] not in index.entries
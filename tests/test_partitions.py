@@ -0,0 +1,41 @@
+from datetime import datetime
+
+from sqlalchemy import text
+
+import partitions
+from models import Show
+
+
+def test_new_partition_takes_rows_from_default(session, catalogue):
+    far = partitions.add_months(datetime.now(), 30)
+    session.add(Show(venue_id=catalogue['venue_id'], artist_id=catalogue['artist_id'],
+                     date=datetime.now(), start_time=far))
+    session.commit()
+    assert session.execute(text('SELECT count(*) FROM shows_default')).scalar() == 1
+
+    created = partitions.ensure_partitions(months_ahead=30)
+
+    name = partitions.partition_name(far)
+    assert name in created
+    assert session.execute(text(f'SELECT count(*) FROM {name}')).scalar() == 1
+    assert session.execute(text('SELECT count(*) FROM shows_default')).scalar() == 0
+    assert 'shows_default' in partitions.list_partitions()
+    assert session.query(Show).filter(Show.start_time == far).count() == 1
+
+
+def test_convert_copies_a_heap_without_timestamps(session, catalogue):
+    session.execute(text('DROP TABLE shows'))
+    session.execute(text(
+        'CREATE TABLE shows (id serial PRIMARY KEY, date timestamp NOT NULL, '
+        'artist_id integer NOT NULL REFERENCES artists (id), venue_id integer NOT NULL REFERENCES venues (id), '
+        'start_time timestamp NOT NULL)'))
+    session.execute(text(
+        "INSERT INTO shows (date, artist_id, venue_id, start_time) "
+        "VALUES (now(), :artist, :venue, now() - interval '400 days')"),
+        {'artist': catalogue['artist_id'], 'venue': catalogue['venue_id']})
+
+    partitions.convert_to_partitioned(months_ahead=1)
+
+    show = session.query(Show).one()
+    assert show.created_at is not None
+    assert partitions.partition_name(show.start_time) in partitions.list_partitions()
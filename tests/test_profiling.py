@@ -0,0 +1,39 @@
+import os
+import time
+
+from flask import Flask, Response, stream_with_context
+
+import profiling
+
+
+def profiled_app(tmp_path):
+    app = Flask(__name__)
+    app.config.update(
+        PROFILE_ENABLED=True, PROFILE_SAMPLE_RATE=1000000, PROFILE_INTERVAL=0.001,
+        PROFILE_DIR=str(tmp_path), PROFILE_MAX_BYTES=1024 * 1024,
+        PROFILE_ADMIN_HEADER='X-Fyyur-Profile', PROFILE_ADMIN_TOKEN='s3cret',
+    )
+    profiling.init_profiling(app)
+
+    def render_rows():
+        for i in range(5):
+            time.sleep(0.02)
+            yield f'<li>{i}</li>'
+
+    @app.route('/rows')
+    def rows():
+        return Response(stream_with_context(render_rows()))
+
+    return app
+
+
+def test_streamed_response_is_profiled_until_the_body_is_sent(tmp_path):
+    client = profiled_app(tmp_path).test_client()
+    response = client.get('/rows', headers={'X-Fyyur-Profile': 's3cret'}, buffered=False)
+    assert not os.path.exists(tmp_path / 'rows')
+    assert response.get_data(as_text=True).count('<li>') == 5
+    response.close()
+
+    [name] = os.listdir(tmp_path / 'rows')
+    assert profiling.parse_filename(name)['duration_ms'] >= 100
+    assert 'render_rows' in (tmp_path / 'rows' / name).read_text()
@@ -0,0 +1,126 @@
+import json
+import logging
+import os
+import time
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, text
+
+import app as app_module
+from request_logging import ACCESS_LOGGER, init_logging
+
+
+@pytest.fixture
+def access_log():
+    records = []
+
+    class Collect(logging.Handler):
+        def emit(self, record):
+            records.append(record)
+
+    handler = Collect()
+    logger = logging.getLogger(ACCESS_LOGGER)
+    logger.addHandler(handler)
+    try:
+        yield records
+    finally:
+        logger.removeHandler(handler)
+
+
+def test_streamed_listing_is_logged_once_the_body_is_sent(client, catalogue, access_log, monkeypatch):
+    listed_artists = app_module.listed_artists
+
+    def slow_artists():
+        for artist in listed_artists():
+            time.sleep(0.05)
+            yield artist
+
+    monkeypatch.setattr(app_module, 'listed_artists', slow_artists)
+    response = client.get('/artists', buffered=False)
+    assert access_log == []
+    body = response.get_data(as_text=True)
+    response.close()
+
+    assert 'Matt Quevedo' in body
+    [record] = access_log
+    assert record.fields['latency_ms'] >= 150
+    assert record.fields['db_queries'] == 1
+    assert record.fields['db_ms'] > 0
+    assert record.request_id == response.headers['X-Request-ID']
+
+
+@pytest.fixture
+def logged_app(tmp_path):
+    app = Flask(__name__)
+    app.config.update(ERROR_LOG_FILE=str(tmp_path / 'error.log'), ACCESS_LOG_FILE=str(tmp_path / 'access.log'))
+    engine = create_engine('sqlite://')
+
+    @app.route('/work')
+    def work():
+        with engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+            connection.execute(text('SELECT 2'))
+        app.logger.warning('did some work')
+        return 'done'
+
+    access_logger = logging.getLogger(ACCESS_LOGGER)
+    existing = list(access_logger.handlers)
+    init_logging(app)
+    yield app
+    app.extensions['log_listener'].stop()
+    for handler in access_logger.handlers[:]:
+        if handler not in existing:
+            access_logger.removeHandler(handler)
+    engine.dispose()
+
+
+def flush_logs(app):
+    listener = app.extensions['log_listener']
+    listener.stop()
+    listener.start()
+
+
+def read_log(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_request_is_logged_as_json_with_query_fields(logged_app, tmp_path):
+    response = logged_app.test_client().get('/work')
+    flush_logs(logged_app)
+
+    [entry] = read_log(tmp_path / 'access.log')
+    assert entry['logger'] == ACCESS_LOGGER and entry['level'] == 'INFO' and entry['message'] == 'request'
+    assert {key: entry[key] for key in ('method', 'route', 'endpoint', 'path', 'status')} == {
+        'method': 'GET', 'route': '/work', 'endpoint': 'work', 'path': '/work', 'status': 200}
+    assert entry['db_queries'] == 2
+    assert 0 < entry['db_ms'] <= entry['latency_ms']
+    assert entry['request_id'] == response.headers['X-Request-ID']
+
+
+def test_request_id_is_propagated_to_every_record(logged_app, tmp_path):
+    response = logged_app.test_client().get('/work', headers={'X-Request-ID': 'abc123'})
+    flush_logs(logged_app)
+
+    assert response.headers['X-Request-ID'] == 'abc123'
+    [access] = read_log(tmp_path / 'access.log')
+    [error] = read_log(tmp_path / 'error.log')
+    assert error['message'] == 'did some work'
+    assert access['request_id'] == error['request_id'] == 'abc123'
+
+
+def test_forked_worker_writes_its_own_records(logged_app, tmp_path):
+    # gunicorn --preload forks workers after init_logging ran in the master
+    pid = os.fork()
+    if pid == 0:
+        try:
+            logged_app.test_client().get('/work', headers={'X-Request-ID': 'child'})
+            logged_app.extensions['log_listener'].stop()
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+    logged_app.test_client().get('/work', headers={'X-Request-ID': 'parent'})
+    flush_logs(logged_app)
+
+    assert sorted(entry['request_id'] for entry in read_log(tmp_path / 'access.log')) == ['child', 'parent']
@@ -0,0 +1,212 @@
+import gzip
+
+import pytest
+
+# Query budgets for every route in app.py. Each data-backed route is measured
+# against the catalogue fixture (3 venues in 2 cities, 3 artists, 5 shows) and
+# again after grow_catalogue adds cities, venues, artists and shows; the two
+# counts must be equal, so a query per row (an N+1) fails here even while it
+# fits the budget. A budget only ever goes down.
+
+
+def venue_form(**overrides):
+    data = {
+        'name': 'The Jazz Cellar', 'city': 'San Francisco', 'state': 'CA',
+        'address': '1 Market Street', 'phone': '415-555-0100', 'genres': ['Jazz', 'Blues'],
+        'image_link': '', 'facebook_link': '', 'website_link': 'https://jazzcellar.example.com',
+        'seeking_description': '',
+    }
+    data.update(overrides)
+    return data
+
+
+def artist_form(**overrides):
+    data = {
+        'name': 'Blue Notes', 'city': 'San Francisco', 'state': 'CA', 'phone': '415-555-0101',
+        'genres': ['Jazz'], 'image_link': '', 'facebook_link': '', 'website_link': '',
+        'seeking_description': '',
+    }
+    data.update(overrides)
+    return data
+
+
+def assert_constant_queries(count_queries, catalogue, grow_catalogue, budget, send):
+    with count_queries() as small:
+        first = send(catalogue)
+    grown = grow_catalogue()
+    with count_queries() as large:
+        second = send(grown)
+    assert len(small) == len(large), (
+        f'{len(small)} queries before growing the catalogue, {len(large)} after:\n' + '\n'.join(large))
+    assert len(large) <= budget, (
+        f'{len(large)} queries, budget is {budget}:\n' + '\n'.join(large))
+    return first, second
+
+
+GET_ROUTES = [
+    ('/', 0),
+    ('/venues', 1),
+    ('/venues/{venue_id}', 3),
+    ('/venues/create', 0),
+    ('/venues/{venue_id}/edit', 1),
+    ('/venues/{venue_id}/matches', 4),
+    ('/artists', 1),
+    ('/artists/{artist_id}', 3),
+    ('/artists/create', 0),
+    ('/artists/{artist_id}/edit', 1),
+    ('/artists/{artist_id}/matches', 4),
+    ('/shows', 1),
+    ('/shows/create', 0),
+    ('/api/metrics/search', 0),
+    ('/analytics', 3),
+]
+
+
+@pytest.mark.parametrize('url, budget', GET_ROUTES)
+def test_get_route_query_budget(client, count_queries, catalogue, grow_catalogue, url, budget):
+    def send(ids):
+        response = client.get(url.format(**ids))
+        # streamed pages only query while the body is read
+        response.get_data()
+        return response
+
+    for response in assert_constant_queries(count_queries, catalogue, grow_catalogue, budget, send):
+        assert response.status_code == 200
+
+
+def test_changes_feed_query_budget(app, client, count_queries, catalogue, grow_catalogue, monkeypatch):
+    # every row is stamped with the test transaction's now(), which the
+    # default lag would hold back; without the lag the payloads are loaded
+    # too, one query per kind on the page
+    monkeypatch.setitem(app.config, 'CHANGES_LAG_SECONDS', 0)
+
+    def send(ids):
+        return client.get('/api/changes')
+
+    small, large = assert_constant_queries(count_queries, catalogue, grow_catalogue, 4, send)
+    assert {change['type'] for change in small.get_json()['changes']} == {'venue', 'artist', 'show'}
+    assert len(large.get_json()['changes']) > len(small.get_json()['changes'])
+
+
+@pytest.mark.parametrize('url, text', [('/shows', 'The Wild Sax Band'), ('/artists', 'Matt Quevedo')])
+def test_listings_are_streamed(client, catalogue, url, text):
+    response = client.get(url)
+    assert response.is_streamed
+    assert text in response.get_data(as_text=True)
+
+
+def test_streamed_listing_is_gzipped(client, catalogue):
+    response = client.get('/artists', headers={'Accept-Encoding': 'gzip'})
+    assert response.is_streamed
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.vary
+    assert 'Matt Quevedo' in gzip.decompress(response.get_data()).decode()
+
+
+@pytest.mark.parametrize('url, budget', [('/venues/search', 1), ('/artists/search', 1)])
+def test_search_query_budget(client, count_queries, catalogue, grow_catalogue, url, budget):
+    # grow_catalogue starts a fresh search cache, so both searches hit the database
+    def send(ids):
+        return client.post(url, data={'search_term': 'a'})
+
+    for response in assert_constant_queries(count_queries, catalogue, grow_catalogue, budget, send):
+        assert response.status_code == 200
+
+
+def test_create_venue_query_budget(client, count_queries, catalogue, grow_catalogue):
+    def send(ids):
+        return client.post('/venues/create', data=venue_form())
+
+    for response in assert_constant_queries(count_queries, catalogue, grow_catalogue, 1, send):
+        assert response.status_code == 200
+
+
+def test_create_artist_query_budget(client, count_queries, catalogue, grow_catalogue):
+    def send(ids):
+        return client.post('/artists/create', data=artist_form())
+
+    for response in assert_constant_queries(count_queries, catalogue, grow_catalogue, 1, send):
+        assert response.status_code == 200
+
+
+def test_create_show_query_budget(client, count_queries, catalogue, grow_catalogue):
+    def send(ids):
+        return client.post('/shows/create', data={'artist_id': ids['artist_id'], 'venue_id': ids['venue_id'],
+                                                  'start_time': '2030-01-01 20:00:00'})
+
+    for response in assert_constant_queries(count_queries, catalogue, grow_catalogue, 6, send):
+        assert response.status_code == 200
+
+
+def test_edit_venue_query_budget(client, count_queries, catalogue, grow_catalogue):
+    # the city changes too, which moves the venue's shows in the rollups
+    def send(ids):
+        return client.post(f"/venues/{ids['venue_id']}/edit", data=venue_form(name='The Musical Hop II', city='Oakland'))
+
+    for response in assert_constant_queries(count_queries, catalogue, grow_catalogue, 3, send):
+        assert response.status_code == 302
+
+
+def test_edit_artist_query_budget(client, count_queries, catalogue, grow_catalogue):
+    # the genres change too, which moves the artist's shows in the rollups
+    def send(ids):
+        return client.post(f"/artists/{ids['artist_id']}/edit", data=artist_form(name='Guns N Roses'))
+
+    for response in assert_constant_queries(count_queries, catalogue, grow_catalogue, 3, send):
+        assert response.status_code == 302
+
+
+def test_delete_venue_query_budget(client, count_queries, catalogue, grow_catalogue):
+    # the grown venue has three times as many shows to cancel
+    def send(ids):
+        return client.get(f"/venues/{ids['venue_id']}/delete")
+
+    for response in assert_constant_queries(count_queries, catalogue, grow_catalogue, 10, send):
+        assert response.status_code == 302
+
+
+def test_stream_shows_query_budget(client, assert_max_queries):
+    with assert_max_queries(0):
+        response = client.get('/stream/shows', buffered=False)
+        assert next(iter(response.response)).startswith(b'retry:')
+        response.close()
+    assert response.status_code == 200
+
+
+def test_admin_profiles_hidden_without_token(client, assert_max_queries):
+    with assert_max_queries(0):
+        response = client.get('/admin/profiles')
+    assert response.status_code == 404
+
+
+def test_admin_profiles_token_only_accepted_in_header(app, client, monkeypatch, assert_max_queries):
+    monkeypatch.setitem(app.config, 'PROFILE_ADMIN_TOKEN', 's3cret')
+    header = app.config['PROFILE_ADMIN_HEADER']
+    with assert_max_queries(0):
+        assert client.get('/admin/profiles?profile_token=s3cret').status_code == 404
+        assert client.get('/admin/profiles', headers={header: 'wrong'}).status_code == 404
+        assert client.get('/admin/profiles', headers={header: 's3cret'}).status_code == 200
+
+
+def test_admin_profile_file_query_budget(app, client, monkeypatch, tmp_path, assert_max_queries):
+    monkeypatch.setitem(app.config, 'PROFILE_ADMIN_TOKEN', 's3cret')
+    monkeypatch.setitem(app.config, 'PROFILE_DIR', str(tmp_path))
+    (tmp_path / 'shows').mkdir()
+    (tmp_path / 'shows' / '00000120ms-1700000000-abc.collapsed').write_text('main (app.py:1) 3\n')
+    url = '/admin/profiles/shows/00000120ms-1700000000-abc.collapsed'
+    header = app.config['PROFILE_ADMIN_HEADER']
+    with assert_max_queries(0):
+        assert client.get(url).status_code == 404
+        response = client.get(url, headers={header: 's3cret'})
+        assert response.get_data(as_text=True) == 'main (app.py:1) 3\n'
+    assert response.status_code == 200
+
+
+def test_admin_profile_file_stays_in_profile_dir(app, client, monkeypatch, tmp_path):
+    monkeypatch.setitem(app.config, 'PROFILE_ADMIN_TOKEN', 's3cret')
+    monkeypatch.setitem(app.config, 'PROFILE_DIR', str(tmp_path / 'profiles'))
+    (tmp_path / 'profiles').mkdir()
+    (tmp_path / 'config.py').write_text('SECRET = 1\n')
+    header = app.config['PROFILE_ADMIN_HEADER']
+    response = client.get('/admin/profiles/%2E%2E/config.py', headers={header: 's3cret'})
+    assert response.status_code == 404
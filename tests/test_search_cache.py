@@ -0,0 +1,105 @@
+import threading
+
+import pytest
+
+import search_cache
+from search_cache import SingleFlight, TTLCache, TokenBucketLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(search_cache.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_ttl_cache_expires_entries(clock):
+    cache = TTLCache(ttl=5)
+    cache.set('jazz', ['The Musical Hop'])
+    clock[0] += 4
+    assert cache.get('jazz') == ['The Musical Hop']
+    clock[0] += 2
+    assert cache.get('jazz') is None
+
+
+def test_ttl_cache_evicts_least_recently_set(clock):
+    cache = TTLCache(ttl=5, max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.set('a', 3)
+    cache.set('c', 4)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (3, 4)
+
+
+def test_single_flight_shares_one_computation(monkeypatch):
+    waiting = threading.Semaphore(0)
+
+    class CountingEvent(threading.Event):
+        def wait(self, timeout=None):
+            waiting.release()
+            return super().wait(timeout)
+
+    class CountingCall(search_cache._Call):
+        def __init__(self):
+            super().__init__()
+            self.done = CountingEvent()
+
+    monkeypatch.setattr(search_cache, '_Call', CountingCall)
+    flights = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'result'
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flights.do('key', compute)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flights.do('key', compute))) for _ in range(3)]
+    for follower in followers:
+        follower.start()
+    # followers must be waiting on the leader before it finishes
+    for _ in followers:
+        assert waiting.acquire(timeout=5)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert sorted(results) == [('result', False)] + [('result', True)] * 3
+
+
+def test_single_flight_propagates_errors_and_forgets_the_key():
+    flights = SingleFlight()
+
+    def fail():
+        raise RuntimeError('database down')
+
+    with pytest.raises(RuntimeError):
+        flights.do('key', fail)
+    assert flights.do('key', lambda: 'ok') == ('ok', False)
+
+
+def test_token_bucket_allows_burst_then_throttles(clock):
+    limiter = TokenBucketLimiter(rate=2, capacity=3)
+    assert [limiter.acquire('10.0.0.1') for _ in range(3)] == [0, 0, 0]
+    assert limiter.acquire('10.0.0.1') == pytest.approx(0.5)
+    assert limiter.acquire('10.0.0.2') == 0
+    clock[0] += 0.5
+    assert limiter.acquire('10.0.0.1') == 0
+
+
+def test_token_bucket_evicts_least_recently_seen_clients(clock):
+    limiter = TokenBucketLimiter(rate=1, capacity=2, max_clients=2)
+    limiter.acquire('a')
+    limiter.acquire('b')
+    limiter.acquire('a')
+    limiter.acquire('c')
+    assert list(limiter._buckets) == ['a', 'c']
+    # 'a' kept its emptied bucket; 'b' would start again from a full one
+    assert limiter.acquire('a') == pytest.approx(1.0)
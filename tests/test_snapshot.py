@@ -0,0 +1,95 @@
+import pytest
+from sqlalchemy import text
+
+import app as app_module
+import snapshot
+from models import db, Artist
+
+
+@pytest.fixture
+def read_only(app, client, catalogue, tmp_path, monkeypatch):
+    path = str(tmp_path / 'snapshot.sqlite3')
+
+    def publish():
+        with app.test_request_context():
+            return snapshot.build(path, app_module.venue_areas, app_module.venue_detail, app_module.artist_detail,
+                                  app_module.listed_artists, app_module.listed_shows)
+
+    publish()
+    monkeypatch.setitem(app.config, 'READ_ONLY', True)
+    monkeypatch.setattr(app_module, 'snapshots', snapshot.SnapshotReader(path, check_interval=0))
+    return publish
+
+
+def test_snapshot_holds_the_live_pages(app, catalogue, read_only):
+    reader = app_module.snapshots
+    with app.test_request_context():
+        assert reader.current().venue(catalogue['venue_id']) == app_module.venue_detail(catalogue['venue_id'])
+        assert reader.current().artist(catalogue['artist_id']) == app_module.artist_detail(catalogue['artist_id'])
+        assert list(reader.current().shows()) == list(app_module.listed_shows())
+        assert reader.current().page('venues') == app_module.venue_areas()
+
+
+@pytest.mark.parametrize('url', ['/venues', '/venues/{venue}', '/artists', '/artists/{artist}', '/shows'])
+def test_read_only_pages_issue_no_queries(client, catalogue, read_only, assert_max_queries, url):
+    url = url.format(venue=catalogue['venue_id'], artist=catalogue['artist_id'])
+    with assert_max_queries(0):
+        response = client.get(url)
+        response.get_data()
+    assert response.status_code == 200
+
+
+def test_read_only_search(client, catalogue, read_only, assert_max_queries):
+    with assert_max_queries(0):
+        response = client.post('/venues/search', data={'search_term': 'hop'})
+    assert response.status_code == 200
+    assert app_module.snapshots.current().search_venues('hop')['count'] == 1
+
+
+def test_read_only_rejects_writes(client, catalogue, read_only, assert_max_queries):
+    with assert_max_queries(0):
+        assert client.post('/artists/create', data={'name': 'Blue Notes'}).status_code == 405
+        assert client.get(f"/artists/{catalogue['artist_id']}/edit").status_code == 404
+        assert client.get('/venues/999999').status_code == 404
+
+
+def test_published_snapshot_is_swapped_in(client, session, catalogue, read_only):
+    assert 'Guns N Petals' in client.get('/artists').get_data(as_text=True)
+    artist = session.get(Artist, catalogue['artist_id'])
+    artist.name = 'Guns N Roses'
+    session.commit()
+    read_only()
+    page = client.get('/artists').get_data(as_text=True)
+    assert 'Guns N Roses' in page
+    assert 'Guns N Petals' not in page
+
+
+def test_missing_snapshot_is_unavailable(app, client, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'READ_ONLY', True)
+    monkeypatch.setattr(app_module, 'snapshots', snapshot.SnapshotReader(str(tmp_path / 'missing.sqlite3')))
+    assert client.get('/shows').status_code == 503
+    assert client.get('/').status_code == 200
+
+
+def test_build_reads_one_repeatable_read_transaction(app, tmp_path, monkeypatch):
+    # a session of its own, outside the per-test transaction, like the CLI's
+    session = db.create_scoped_session()
+    monkeypatch.setattr(db, 'session', session)
+    seen = []
+
+    def record(builder):
+        def wrapped(*args):
+            seen.append(tuple(session.execute(text('SELECT current_setting(\'transaction_isolation\'), now()')).one()))
+            return builder(*args)
+        return wrapped
+
+    with app.test_request_context():
+        try:
+            snapshot.build(str(tmp_path / 'snapshot.sqlite3'), record(app_module.venue_areas),
+                           app_module.venue_detail, app_module.artist_detail,
+                           record(app_module.listed_artists), record(app_module.listed_shows))
+            assert not session().in_transaction()
+        finally:
+            session.remove()
+    assert len(seen) == 3
+    assert set(seen) == {('repeatable read', seen[0][1])}
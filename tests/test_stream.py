@@ -0,0 +1,67 @@
+import json
+
+import show_events
+
+
+def test_committed_show_is_published(client, catalogue):
+    subscriber = show_events.broker.subscribe()
+    try:
+        client.post('/shows/create', data={'artist_id': catalogue['artist_id'],
+                                           'venue_id': catalogue['venue_id'],
+                                           'start_time': '2030-01-01 20:00:00'})
+        change = subscriber.get(timeout=1)
+    finally:
+        show_events.broker.unsubscribe(subscriber)
+    assert change['op'] == 'created'
+    assert change['venue_id'] == catalogue['venue_id']
+    assert change['start_time'] == '2030-01-01 20:00:00'
+
+
+def test_cancelled_shows_are_published(client, catalogue):
+    subscriber = show_events.broker.subscribe()
+    try:
+        client.get(f"/venues/{catalogue['venue_id']}/delete")
+        changes = [subscriber.get(timeout=1), subscriber.get(timeout=1)]
+    finally:
+        show_events.broker.unsubscribe(subscriber)
+    assert [change['op'] for change in changes] == ['cancelled', 'cancelled']
+
+
+def test_stream_delivers_events(client):
+    response = client.get('/stream/shows', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    chunks = iter(response.response)
+    assert next(chunks).startswith(b'retry:')
+
+    change = {'op': 'changed', 'id': 1, 'venue_id': 2, 'artist_id': 3, 'start_time': '2030-01-01 20:00:00'}
+    show_events.broker.publish(change)
+    frame = next(chunks).decode()
+    response.close()
+    assert frame.startswith('event: changed\n')
+    assert json.loads(frame.split('data: ', 1)[1]) == change
+
+
+def test_slow_subscriber_is_dropped():
+    broker = show_events.Broker(max_pending=1)
+    subscriber = broker.subscribe()
+    broker.publish({'op': 'created'})
+    broker.publish({'op': 'created'})
+    assert subscriber.get_nowait() is None
+    broker.publish({'op': 'created'})
+    assert subscriber.empty()
+
+
+def test_subscribers_beyond_the_cap_get_503(app, client, monkeypatch):
+    monkeypatch.setattr(show_events.broker, 'max_subscribers', 1)
+    first = client.get('/stream/shows', buffered=False)
+    assert next(iter(first.response)).startswith(b'retry:')
+    try:
+        second = client.get('/stream/shows')
+        assert second.status_code == 503
+        assert second.headers['Retry-After'] == str(app.config['SHOW_EVENTS_KEEPALIVE'])
+    finally:
+        first.close()
+    # closing the first stream frees its slot
+    third = client.get('/stream/shows', buffered=False)
+    assert third.status_code == 200
+    third.close()